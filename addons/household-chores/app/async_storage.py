@@ -0,0 +1,205 @@
+"""
+Async front end for the storage backends.
+
+Every storage call runs on one dedicated worker thread, so slow disk writes
+(an SD card flushing, an fsync) never block the event loop. Having a single
+thread also means the backends keep seeing one caller at a time, exactly as
+before, and the SQLite connection is only used from that thread.
+
+Read-modify-write cycles on a task are serialized with per-task locks
+(lock_tasks), so concurrent updates of different tasks don't wait for each
+other.
+
+With a group commit delay, writes return once the shared flush has put them
+on disk, so nothing is acknowledged that a power cut could still lose.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from app.models import Device, FrequencyType, Task
+from app.storage import SQLiteStorage, Storage
+
+# Set while the current task holds a transaction, so its own writes don't
+# wait for the write lock it already holds
+_in_transaction: ContextVar[bool] = ContextVar("in_storage_transaction", default=False)
+
+# Task locks held by the current task, so nested helpers can re-enter them
+_held_task_locks: ContextVar[FrozenSet[str]] = ContextVar("held_task_locks", default=frozenset())
+
+
+class AsyncStorage:
+    """Run a storage backend's methods on a single worker thread."""
+
+    def __init__(self, storage: Union[Storage, SQLiteStorage]):
+        """
+        Wrap a storage backend.
+
+        Args:
+            storage: The backend; it must not be used directly afterwards
+        """
+        self.sync = storage
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._write_lock = asyncio.Lock()
+        # task id -> [lock, number of holders and waiters]
+        self._task_locks: Dict[str, list] = {}
+
+    @property
+    def changes(self):
+        """The backend's revision bookkeeping (plain attribute reads)."""
+        return self.sync.changes
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a callable on the storage thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def _call_and_get_commit(self, fn: Callable, *args) -> Tuple[Any, Any]:
+        """On the storage thread: run fn, then pick up the commit it waits for."""
+        return fn(*args), self.sync.pending_commit()
+
+    async def _write(self, fn: Callable, *args) -> Any:
+        """Run a mutation, waiting for any open transaction of another task."""
+        # A transaction's writes are committed (and waited for) when it ends
+        if _in_transaction.get():
+            return await self.run(fn, *args)
+        async with self._write_lock:
+            result, pending = await self.run(self._call_and_get_commit, fn, *args)
+        # Wait outside the lock, so the next writers join the same commit
+        if pending is not None:
+            await asyncio.wrap_future(pending)
+        return result
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """
+        Group the current task's writes into a single commit.
+
+        Writes from other tasks wait until the transaction ends; reads go on.
+        """
+        async with self._write_lock:
+            # Entered and exited on the storage thread, which owns its lock
+            transaction = self.sync.transaction()
+            await self.run(transaction.__enter__)
+            token = _in_transaction.set(True)
+            pending = None
+            try:
+                yield
+            except BaseException as e:
+                await self.run(transaction.__exit__, type(e), e, e.__traceback__)
+                raise
+            else:
+                _, pending = await self.run(self._call_and_get_commit, transaction.__exit__, None, None, None)
+            finally:
+                _in_transaction.reset(token)
+        if pending is not None:
+            await asyncio.wrap_future(pending)
+
+    @asynccontextmanager
+    async def lock_tasks(self, *task_ids: str) -> AsyncIterator[None]:
+        """
+        Hold the locks of the given tasks.
+
+        Locks are taken in sorted order, so callers locking overlapping sets
+        can't deadlock, and a task that already holds a lock may take it
+        again. Take task locks before transaction(), never inside it.
+        """
+        held = _held_task_locks.get()
+        wanted = sorted(set(task_ids) - held)
+        waiting, acquired = [], []
+        try:
+            for task_id in wanted:
+                entry = self._task_locks.setdefault(task_id, [asyncio.Lock(), 0])
+                entry[1] += 1
+                waiting.append(entry)
+                await entry[0].acquire()
+                acquired.append(entry)
+            token = _held_task_locks.set(held | frozenset(wanted))
+            try:
+                yield
+            finally:
+                _held_task_locks.reset(token)
+        finally:
+            for entry in acquired:
+                entry[0].release()
+            for task_id, entry in zip(wanted, waiting):
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._task_locks[task_id]
+
+    # Reads
+
+    async def get_tasks(self) -> List[Task]:
+        return await self.run(self.sync.get_tasks)
+
+    async def get_task(self, task_id: str) -> Optional[Task]:
+        return await self.run(self.sync.get_task, task_id)
+
+    async def query_tasks(
+        self,
+        assigned_to: Optional[str] = None,
+        frequency: Optional[FrequencyType] = None,
+        due_after: Optional[datetime] = None,
+        due_before: Optional[datetime] = None,
+        after: Optional[Tuple[float, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        return await self.run(
+            self.sync.query_tasks,
+            assigned_to=assigned_to,
+            frequency=frequency,
+            due_after=due_after,
+            due_before=due_before,
+            after=after,
+            limit=limit,
+        )
+
+    async def get_task_changes(self, since: int) -> Tuple[int, bool, List[Task], List[str]]:
+        return await self.run(self.sync.get_task_changes, since)
+
+    async def count_tasks(self) -> int:
+        return await self.run(self.sync.count_tasks)
+
+    async def get_devices(self) -> List[Device]:
+        return await self.run(self.sync.get_devices)
+
+    async def get_device(self, device_id: str) -> Optional[Device]:
+        return await self.run(self.sync.get_device, device_id)
+
+    async def get_devices_by_id(self, device_ids: Iterable[str]) -> Dict[str, Device]:
+        return await self.run(self.sync.get_devices_by_id, list(device_ids))
+
+    async def get_device_task_ids(self, device_id: str) -> List[str]:
+        return await self.run(self.sync.get_device_task_ids, device_id)
+
+    async def get_dangling_assignments(self) -> Dict[str, List[str]]:
+        return await self.run(self.sync.get_dangling_assignments)
+
+    async def count_devices(self) -> int:
+        return await self.run(self.sync.count_devices)
+
+    # Writes
+
+    async def save_task(self, task: Task, expected_version: Optional[int] = None) -> int:
+        return await self._write(self.sync.save_task, task, expected_version)
+
+    async def delete_task(self, task_id: str, expected_version: Optional[int] = None) -> int:
+        return await self._write(self.sync.delete_task, task_id, expected_version)
+
+    async def save_device(self, device: Device) -> None:
+        await self._write(self.sync.save_device, device)
+
+    async def delete_device(self, device_id: str) -> List[Tuple[Task, int]]:
+        return await self._write(self.sync.delete_device, device_id)
+
+    async def flush(self) -> None:
+        await self.run(self.sync.flush)
+
+    async def close(self) -> None:
+        """Close the backend and stop the worker thread."""
+        await self.run(self.sync.close)
+        self._executor.shutdown(wait=True)
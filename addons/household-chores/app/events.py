@@ -0,0 +1,103 @@
+"""
+Push stream of task changes for dashboards and the Home Assistant integration.
+
+Mutations in main.py publish events on an in-process bus; each /events client
+gets its own bounded queue. A client that falls too far behind is
+disconnected rather than buffering without limit, and can catch up through
+GET /tasks/changes using the revision of the last event it received.
+"""
+import asyncio
+import json
+import logging
+from enum import Enum
+from typing import Any, Dict, Optional, Set
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is dropped
+DEFAULT_QUEUE_SIZE = 256
+
+
+class EventType(str, Enum):
+    """Kinds of events pushed to subscribers."""
+    READY = "ready"
+    TASK_CREATED = "task_created"
+    TASK_UPDATED = "task_updated"
+    TASK_DONE = "task_done"
+    TASK_POSTPONED = "task_postponed"
+    TASK_DELETED = "task_deleted"
+    NOTIFICATION_SENT = "notification_sent"
+
+
+class Event(BaseModel):
+    """A single pushed event."""
+    type: EventType
+    revision: int  # Storage revision after the change
+    data: Dict[str, Any] = {}
+
+    def to_sse(self) -> str:
+        """Encode the event as a Server-Sent Events message."""
+        payload = json.dumps({"revision": self.revision, **self.data}, default=str)
+        return f"id: {self.revision}\nevent: {self.type.value}\ndata: {payload}\n\n"
+
+
+class EventBus:
+    """Fan events out to all connected subscribers."""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize the bus.
+
+        Args:
+            queue_size: Events buffered per subscriber before it is dropped
+        """
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Register a new subscriber.
+
+        Returns:
+            A queue that yields Event objects, and None once the
+            subscription has ended
+        """
+        # One slot is kept free for the end-of-stream marker
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size + 1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Remove a subscriber."""
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type: EventType, revision: int, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Send an event to every subscriber without blocking.
+
+        Must be called from the event loop thread.
+        """
+        if not self._subscribers:
+            return
+        event = Event(type=event_type, revision=revision, data=data or {})
+        for queue in list(self._subscribers):
+            if queue.qsize() >= self.queue_size:
+                logger.warning("Dropping slow event subscriber")
+                self._end(queue)
+                continue
+            queue.put_nowait(event)
+
+    def _end(self, queue: asyncio.Queue) -> None:
+        """End a subscription; its reader sees None."""
+        self._subscribers.discard(queue)
+        queue.put_nowait(None)
+
+    def close(self) -> None:
+        """End all subscriptions."""
+        for queue in list(self._subscribers):
+            self._end(queue)
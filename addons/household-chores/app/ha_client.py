@@ -2,23 +2,70 @@
 Home Assistant REST API client for sending notifications.
 """
 import logging
+import time
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Optional
 
 import httpx
+from pydantic import BaseModel
+
+from app.metrics import NOTIFICATION_LATENCY, NOTIFICATIONS
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Default connection pool size for the shared HTTP client
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+# HTTP status codes worth retrying besides 5xx
+RETRYABLE_STATUS_CODES = {408, 429}
+
+# Errors showing that Home Assistant accepted the call and only rejected its
+# payload (400) or service name (404). Any other error, notably a 401/403
+# for a revoked token, means Home Assistant isn't usable.
+CONNECTED_STATUS_CODES = {400, 404}
+
+
+class NotificationResult(BaseModel):
+    """Outcome of a single notify service call."""
+    success: bool
+    retryable: bool = False
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+    error: Optional[str] = None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
 class HAClient:
     """Client for interacting with Home Assistant REST API."""
 
-    def __init__(self, ha_url: str, ha_token: str):
+    def __init__(self, ha_url: str, ha_token: str, max_connections: int = DEFAULT_MAX_CONNECTIONS):
         """
         Initialize Home Assistant client.
 
         Args:
             ha_url: Base URL of Home Assistant (e.g., http://192.168.1.100:8123)
             ha_token: Long-lived access token from Home Assistant
+            max_connections: Size of the shared connection pool
         """
         self.ha_url = ha_url.rstrip("/")
         self.ha_token = ha_token
@@ -26,6 +73,52 @@ class HAClient:
             "Authorization": f"Bearer {ha_token}",
             "Content-Type": "application/json",
         }
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Last known connection state, fed by probes and real calls
+        self.connected = False
+        self._state_updated: Optional[float] = None
+
+    def record_connection(self, connected: bool) -> None:
+        """Record the connection state observed by a call to Home Assistant."""
+        self.connected = connected
+        self._state_updated = time.monotonic()
+
+    @property
+    def connection_age(self) -> Optional[float]:
+        """Seconds since the connection state was last observed (None: never)."""
+        if self._state_updated is None:
+            return None
+        return time.monotonic() - self._state_updated
+
+    async def start(self) -> None:
+        """Open the shared, keep-alive HTTP client."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+            ),
+            # HTTP/2 is negotiated over TLS only, and only if h2 is installed
+            http2=HTTP2_AVAILABLE,
+        )
+        logger.debug(f"HTTP client opened (pool size {self.max_connections}, http2={HTTP2_AVAILABLE})")
+
+    async def close(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client, opening it on first use."""
+        if self._client is None:
+            await self.start()
+        return self._client
 
     async def send_notification(
         self,
@@ -48,34 +141,84 @@ class HAClient:
         Returns:
             True if successful, False otherwise
         """
-        if not notify_service.startswith("notify."):
-            notify_service = f"notify.{notify_service}"
+        payload = self.build_payload(title, message, actions=actions, data=data)
+        result = await self.deliver(notify_service, payload)
+        return result.success
 
-        payload = {
+    @staticmethod
+    def build_payload(
+        title: str,
+        message: str,
+        actions: Optional[list] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Build the notify service payload from its parts."""
+        payload: Dict[str, Any] = {
             "title": title,
             "message": message,
         }
 
         if actions:
-            if data is None:
-                data = {}
+            data = dict(data or {})
             data["actions"] = actions
 
         if data:
             payload["data"] = data
 
+        return payload
+
+    async def deliver(self, notify_service: str, payload: Dict[str, Any]) -> NotificationResult:
+        """
+        Call a notify service with a prepared payload.
+
+        Args:
+            notify_service: Service name (e.g., 'notify.mobile_app_johans_iphone')
+            payload: Service data as built by build_payload()
+
+        Returns:
+            The result, including whether a failure is worth retrying
+        """
+        if not notify_service.startswith("notify."):
+            notify_service = f"notify.{notify_service}"
+
+        started = time.perf_counter()
+        result = await self._call_notify(notify_service, payload)
+        if result.success:
+            outcome = "success"
+        else:
+            outcome = "retryable" if result.retryable else "failed"
+        NOTIFICATION_LATENCY.labels(notify_service, outcome).observe(time.perf_counter() - started)
+        NOTIFICATIONS.labels(notify_service, outcome).inc()
+        return result
+
+    async def _call_notify(self, notify_service: str, payload: Dict[str, Any]) -> NotificationResult:
+        """POST a payload to a notify service and classify the outcome."""
         try:
-            async with httpx.AsyncClient() as client:
-                # Call the notify service via Home Assistant API
-                # The service name format is 'notify.service_name'
-                url = f"{self.ha_url}/api/services/{notify_service.split('.')[0]}/{notify_service.split('.')[1]}"
-                response = await client.post(url, json=payload, headers=self.headers, timeout=10.0)
-                response.raise_for_status()
-                logger.info(f"Notification sent to {notify_service}: {title}")
-                return True
+            client = await self._get_client()
+            # Call the notify service via Home Assistant API
+            # The service name format is 'notify.service_name'
+            url = f"{self.ha_url}/api/services/{notify_service.split('.')[0]}/{notify_service.split('.')[1]}"
+            response = await client.post(url, json=payload, timeout=10.0)
+            response.raise_for_status()
+            self.record_connection(True)
+            logger.info(f"Notification sent to {notify_service}: {payload.get('title')}")
+            return NotificationResult(success=True, status_code=response.status_code)
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            self.record_connection(status in CONNECTED_STATUS_CODES)
+            logger.error(f"Failed to send notification to {notify_service}: {e}")
+            return NotificationResult(
+                success=False,
+                retryable=status >= 500 or status in RETRYABLE_STATUS_CODES,
+                status_code=status,
+                retry_after=parse_retry_after(e.response.headers.get("Retry-After")),
+                error=str(e),
+            )
         except Exception as e:
+            # Connection errors and timeouts: HA is unreachable or restarting
+            self.record_connection(False)
             logger.error(f"Failed to send notification to {notify_service}: {e}")
-            return False
+            return NotificationResult(success=False, retryable=True, error=str(e))
 
     async def check_connection(self) -> bool:
         """
@@ -85,15 +228,13 @@ class HAClient:
             True if connected, False otherwise
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.ha_url}/api/",
-                    headers=self.headers,
-                    timeout=5.0
-                )
-                response.raise_for_status()
-                logger.info("Successfully connected to Home Assistant")
-                return True
+            client = await self._get_client()
+            response = await client.get(f"{self.ha_url}/api/", timeout=5.0)
+            response.raise_for_status()
+            logger.debug("Successfully connected to Home Assistant")
+            self.record_connection(True)
+            return True
         except Exception as e:
             logger.error(f"Failed to connect to Home Assistant at {self.ha_url}: {e}")
+            self.record_connection(False)
             return False
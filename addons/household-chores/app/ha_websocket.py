@@ -0,0 +1,139 @@
+"""
+Home Assistant WebSocket API client for notification actions.
+
+Keeps one authenticated connection to Home Assistant and subscribes to
+mobile_app_notification_action events, so tapping Done or Postpone on a phone
+reaches the add-on directly instead of going through an automation and a
+rest_command.
+"""
+import asyncio
+import json
+import logging
+import random
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit, urlunsplit
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_ACTION_EVENT = "mobile_app_notification_action"
+
+# Reconnect backoff, in seconds
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+ActionHandler = Callable[[dict], Awaitable[None]]  # Called with the whole event
+
+
+class HAAuthError(Exception):
+    """Home Assistant rejected the access token."""
+
+
+def websocket_url(ha_url: str) -> str:
+    """
+    Derive the WebSocket API URL from the Home Assistant base URL.
+
+    http(s)://host:8123 becomes ws(s)://host:8123/api/websocket. The
+    Supervisor proxy (http://supervisor/core) serves it at /core/websocket.
+    """
+    parts = urlsplit(ha_url.rstrip("/"))
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    path = parts.path + ("/websocket" if parts.hostname == "supervisor" else "/api/websocket")
+    return urlunsplit((scheme, parts.netloc, path, "", ""))
+
+
+class HAEventListener:
+    """Subscribe to Home Assistant events over a persistent WebSocket."""
+
+    def __init__(
+        self,
+        url: str,
+        ha_token: str,
+        handler: ActionHandler,
+        event_type: str = NOTIFICATION_ACTION_EVENT,
+    ):
+        """
+        Initialize the listener.
+
+        Args:
+            url: WebSocket API URL (see websocket_url())
+            ha_token: Long-lived access token
+            handler: Coroutine called with every event received (event_type,
+                data, context, ...)
+            event_type: Event type to subscribe to
+        """
+        self.url = url
+        self.ha_token = ha_token
+        self.handler = handler
+        self.event_type = event_type
+        self.connected = False
+        self._message_id = 0
+
+    def _next_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    async def _handshake(self, ws) -> None:
+        """Authenticate and subscribe to the event type."""
+        message = json.loads(await ws.recv())
+        if message.get("type") != "auth_required":
+            raise ConnectionError(f"Unexpected message during handshake: {message}")
+
+        await ws.send(json.dumps({"type": "auth", "access_token": self.ha_token}))
+        message = json.loads(await ws.recv())
+        if message.get("type") == "auth_invalid":
+            raise HAAuthError(message.get("message", "Invalid access token"))
+        if message.get("type") != "auth_ok":
+            raise ConnectionError(f"Unexpected message during handshake: {message}")
+
+        subscription_id = self._next_id()
+        await ws.send(json.dumps({"id": subscription_id, "type": "subscribe_events", "event_type": self.event_type}))
+        message = json.loads(await ws.recv())
+        if message.get("id") != subscription_id or not message.get("success"):
+            raise ConnectionError(f"Could not subscribe to {self.event_type}: {message}")
+
+    async def _dispatch(self, event: dict) -> None:
+        """Run the handler for one event, keeping the connection alive on errors."""
+        try:
+            await self.handler(event)
+        except Exception as e:
+            logger.error(f"Error handling {self.event_type} event {event.get('data')}: {e}", exc_info=True)
+
+    async def listen_once(self) -> None:
+        """Connect, subscribe and handle events until the connection drops."""
+        self._message_id = 0
+        async with websockets.connect(self.url, max_size=None) as ws:
+            await self._handshake(ws)
+            self.connected = True
+            logger.info(f"Subscribed to {self.event_type} events at {self.url}")
+            try:
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get("type") == "event":
+                        await self._dispatch(message.get("event", {}))
+            finally:
+                self.connected = False
+
+    async def run(self) -> None:
+        """
+        Background task keeping the subscription alive.
+
+        Reconnects with exponential backoff and jitter. A rejected token is
+        retried at the longest delay, since it only changes on a restart.
+        """
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self.listen_once()
+                logger.warning("Home Assistant closed the WebSocket connection")
+                delay = RECONNECT_MIN_DELAY
+            except asyncio.CancelledError:
+                raise
+            except HAAuthError as e:
+                logger.error(f"Home Assistant rejected the access token for the WebSocket API: {e}")
+                delay = RECONNECT_MAX_DELAY
+            except Exception as e:
+                logger.warning(f"Home Assistant WebSocket connection lost: {e}")
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
@@ -0,0 +1,119 @@
+"""
+Deduplication of notification actions.
+
+Push retries and automations can deliver the same notification action more
+than once. Each delivery carries an idempotency key (the notification's tag
+plus the action, or the Home Assistant event id); the first result for a key
+is kept in a bounded TTL cache, persisted to actions.json under the data
+directory, and returned for every repeat without touching the task again.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.storage import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# How long a handled action is remembered, in seconds
+DEFAULT_ACTION_TTL = 24 * 3600.0
+# Upper bound on remembered actions; the oldest are dropped first
+MAX_CACHED_ACTIONS = 1000
+
+
+def action_key(action: str, tag: Optional[str] = None, event_id: Optional[str] = None) -> Optional[str]:
+    """
+    Idempotency key of a notification action.
+
+    The notification tag identifies one reminder across retries and devices;
+    the event id only identifies one delivery of the event.
+
+    Returns:
+        The key, or None if the delivery carries nothing to deduplicate by
+    """
+    if tag:
+        return f"{tag}:{action}"
+    if event_id:
+        return f"event:{event_id}"
+    return None
+
+
+class ActionCache:
+    """Bounded TTL cache of handled notification actions."""
+
+    def __init__(
+        self,
+        data_dir: str,
+        run: Callable[..., Awaitable[Any]],
+        ttl: float = DEFAULT_ACTION_TTL,
+        max_entries: int = MAX_CACHED_ACTIONS,
+    ):
+        """
+        Initialize the cache and load remembered actions from disk.
+
+        Args:
+            data_dir: Directory for actions.json
+            run: Coroutine running a blocking call off the event loop
+                (AsyncStorage.run), used to write the file
+            ttl: Seconds an action is remembered
+            max_entries: Maximum number of remembered actions
+        """
+        self.cache_file = Path(data_dir) / "actions.json"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._run = run
+        # key -> (expiry time, result), oldest first
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        """Load unexpired actions from disk."""
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            logger.error(f"Could not parse {self.cache_file.name}: {e}")
+            return
+        now = time.time()
+        for item in data.get("actions", []):
+            if item["expires"] > now:
+                self._entries[item["key"]] = (item["expires"], item["result"])
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Result of an action handled earlier under this key, if still remembered."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires <= time.time():
+            del self._entries[key]
+            return None
+        return result
+
+    async def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Remember the result of a handled action and persist the cache."""
+        now = time.time()
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, result)
+        # Entries are in insertion order, which is also expiry order
+        while self._entries:
+            oldest_key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_key]
+
+        snapshot = {
+            "actions": [
+                {"key": k, "expires": expires, "result": result}
+                for k, (expires, result) in self._entries.items()
+            ]
+        }
+        await self._run(write_json_atomic, self.cache_file, snapshot)
@@ -3,26 +3,68 @@ Home Assistant Chores Add-on - Main FastAPI Application
 Handles task management, device management, and notification scheduling.
 """
 import asyncio
+import json
 import logging
 import os
-from datetime import datetime
-from typing import List
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from uuid import uuid4
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app.async_storage import AsyncStorage
+from app.events import Event, EventBus, EventType
 from app.ha_client import HAClient
+from app.ha_websocket import HAEventListener, websocket_url
+from app.idempotency import DEFAULT_ACTION_TTL, ActionCache, action_key
+from app.metrics import (
+    CONTENT_TYPE_LATEST,
+    DEVICES,
+    REQUEST_LATENCY,
+    SCHEDULER_LAG,
+    SCHEDULER_TICK_DURATION,
+    TASKS,
+    generate_latest,
+)
 from app.models import (
+    BatchOperationType,
     Device,
     DeviceCreateRequest,
     FrequencyType,
     Task,
+    TaskBatchOperation,
+    TaskBatchRequest,
+    TaskBatchResponse,
+    TaskBatchResult,
+    TaskChangesResponse,
     TaskCreateRequest,
     TaskPostponeRequest,
 )
-from app.scheduler import compute_next_due, get_current_time, get_notification_time, is_weekday
-from app.storage import Storage
+from app.notifier import (
+    DEFAULT_DIGEST_THRESHOLD,
+    DEFAULT_NOTIFY_CONCURRENCY,
+    DispatchReport,
+    NotificationDispatcher,
+)
+from app.outbox import Outbox
+from app.scheduler import (
+    NOTIFICATION_WINDOW,
+    DueQueue,
+    compute_next_due,
+    compute_notify_at,
+    get_current_time,
+    get_notification_time,
+    is_notification_slot,
+    localize,
+    set_timezone,
+    to_utc,
+)
+from app.storage import VersionConflict, create_storage, decode_cursor, encode_cursor
 
 # Configure logging
 logging.basicConfig(
@@ -47,21 +89,127 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record the latency of every request, labelled with its route template."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        request.method, route.path if route else "unmatched", response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
 # Global state
-storage: Storage = None
+storage: AsyncStorage = None
 ha_client: HAClient = None
 scheduler_task: asyncio.Task = None
+due_queue: DueQueue = None
+dispatcher: NotificationDispatcher = None
+outbox: Outbox = None
+action_cache: ActionCache = None
+outbox_task: asyncio.Task = None
+health_task: asyncio.Task = None
+event_bus: EventBus = EventBus()
+event_listener: HAEventListener = None
+event_listener_task: asyncio.Task = None
+
+# Events held back until the enclosing batch has committed (None: publish now)
+_deferred_events: ContextVar[Optional[List[Tuple[EventType, int, Any]]]] = ContextVar(
+    "deferred_events", default=None
+)
+
+# How often the background prober refreshes the cached HA connection state
+HEALTH_PROBE_INTERVAL = 60.0
+
+# Page size limits for GET /tasks, and the chunk size used when streaming
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Seconds between keep-alive comments on idle /events streams
+EVENTS_KEEPALIVE_INTERVAL = 15.0
+
+# Add-on options as written by the Supervisor, read at startup
+addon_options: dict = {}
 
 
 class ActionRequest(BaseModel):
     """Request body for /ha/action endpoint."""
     action: str
+    tag: Optional[str] = None  # Tag of the notification the action came from
+    event_id: Optional[str] = None  # Context id of the Home Assistant event
 
 
 class HealthCheckResponse(BaseModel):
     """Health check response."""
     status: str
     ha_connected: bool = False
+    ha_checked_age: Optional[float] = None  # Seconds since ha_connected was observed
+
+
+def load_addon_options(data_dir: str) -> dict:
+    """Read the add-on options the Supervisor writes to options.json ({} outside an add-on)."""
+    path = os.path.join(data_dir, "options.json")
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Could not read add-on options from {path}: {e}")
+        return {}
+
+
+def get_option(name: str, default=None):
+    """
+    Get a setting from the add-on options, falling back to the environment.
+
+    The option `storage_backend` falls back to STORAGE_BACKEND, and so on.
+    Options left empty count as unset.
+    """
+    value = addon_options.get(name)
+    if value is None or value == "":
+        value = os.getenv(name.upper())
+    if value is None or value == "":
+        return default
+    return value
+
+
+def get_bool_option(name: str, default: bool) -> bool:
+    """Get a true/false setting; see get_option()."""
+    return str(get_option(name, default)).lower() == "true"
+
+
+def _etag(revision: int) -> str:
+    """Format a storage revision or task version as an ETag."""
+    return f'"{revision}"'
+
+
+def _if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """Task version required by an If-Match header (None: any version)."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match header: {if_match}")
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client's If-None-Match matches the ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [tag.strip() for tag in header.split(",")]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
 
 
 # ============================================================================
@@ -71,28 +219,61 @@ class HealthCheckResponse(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application on startup."""
-    global storage, ha_client, scheduler_task
+    global storage, ha_client, scheduler_task, due_queue, dispatcher, outbox, outbox_task, health_task, action_cache
+    global event_listener, event_listener_task, addon_options
 
     logger.info("Starting Home Assistant Chores Add-on...")
 
-    # Initialize storage
+    # Settings come from the add-on options, or from environment variables
+    # when running outside Home Assistant
     data_dir = os.getenv("DATA_DIR", "/data")
-    storage = Storage(data_dir=data_dir)
-    logger.info(f"Storage initialized at {data_dir}")
+    addon_options = load_addon_options(data_dir)
+    log_level = str(get_option("log_level", "info")).upper()
+    if log_level in logging.getLevelNamesMapping():
+        logging.getLogger().setLevel(log_level)
+    else:
+        logger.error(f"Unknown log level {log_level!r}; using INFO")
+
+    timezone_name = get_option("timezone", "Europe/Stockholm")
+    try:
+        set_timezone(timezone_name)
+    except Exception as e:
+        logger.error(f"Invalid timezone {timezone_name!r} ({e}); using Europe/Stockholm")
+
+    # Initialize storage
+    storage_backend = get_option("storage_backend", "json")
+    commit_delay = float(get_option("storage_commit_delay", 0))
+    # Storage calls run on a worker thread so disk writes never block the loop
+    storage = AsyncStorage(
+        create_storage(backend=storage_backend, data_dir=data_dir, commit_delay=commit_delay)
+    )
+    logger.info(f"Storage initialized at {data_dir} (backend: {storage_backend})")
+
+    # Assignments left behind by devices deleted before they were unassigned
+    for device_id, task_ids in (await storage.get_dangling_assignments()).items():
+        logger.warning(
+            f"Device {device_id} not found but assigned to {len(task_ids)} task(s): {', '.join(task_ids)}"
+        )
+
+    # Remember handled notification actions so repeated deliveries are ignored
+    action_ttl = float(get_option("action_dedup_ttl", DEFAULT_ACTION_TTL))
+    action_cache = ActionCache(data_dir, run=storage.run, ttl=action_ttl)
 
     # Initialize Home Assistant client
-    # Get HA configuration from environment variables or use defaults
-    ha_url = os.getenv("HA_URL", "http://localhost:8123")
-    ha_token = os.getenv("HA_TOKEN", "")
+    ha_url = get_option("ha_url", "http://localhost:8123")
+    ha_token = get_option("ha_token", "")
 
     if not ha_token:
         logger.warning(
-            "HA_TOKEN environment variable not set. "
+            "No Home Assistant token configured. "
             "Notifications will not work. "
-            "Set HA_TOKEN to your Home Assistant long-lived access token."
+            "Set the ha_token option (or HA_TOKEN) to your Home Assistant long-lived access token."
         )
 
-    ha_client = HAClient(ha_url=ha_url, ha_token=ha_token)
+    # The connection pool is sized to the notification fan-out
+    notify_concurrency = int(get_option("notify_concurrency", DEFAULT_NOTIFY_CONCURRENCY))
+    ha_client = HAClient(ha_url=ha_url, ha_token=ha_token, max_connections=notify_concurrency)
+    await ha_client.start()
 
     # Test Home Assistant connection
     if ha_token:
@@ -102,7 +283,47 @@ async def startup_event():
         else:
             logger.warning("Could not connect to Home Assistant")
 
-    # Start the scheduler task
+    health_task = asyncio.create_task(health_probe_loop())
+
+    # Receive notification actions straight from the Home Assistant event bus
+    if ha_token and get_bool_option("ha_event_listener", True):
+        ws_url = get_option("ha_websocket_url") or websocket_url(ha_url)
+        event_listener = HAEventListener(ws_url, ha_token, handle_notification_action_event)
+        event_listener_task = asyncio.create_task(event_listener.run())
+
+    # Undelivered notifications are retried from a persistent outbox
+    outbox = Outbox(data_dir=data_dir, ha_client=ha_client, run=storage.run, storage=storage)
+    outbox_task = asyncio.create_task(outbox.run())
+    # In digest mode each phone gets one notification for all chores due at once
+    dispatcher = NotificationDispatcher(
+        storage,
+        ha_client,
+        concurrency=notify_concurrency,
+        outbox=outbox,
+        digest=get_bool_option("notify_digest", False),
+        digest_threshold=int(get_option("notify_digest_threshold", DEFAULT_DIGEST_THRESHOLD)),
+        digest_url=get_option("notify_digest_url"),
+    )
+
+    # Build the due-time index and start the scheduler task
+    due_queue = DueQueue()
+    now = get_current_time()
+    rescheduled = []
+    for task in await storage.get_tasks():
+        if task.notify_at and not is_notification_slot(task.notify_at):
+            # Computed in another timezone: move to that day's slot in this one
+            slot = get_notification_time(task.notify_at)
+            schedule_task(task, after=max(to_utc(slot), to_utc(now - NOTIFICATION_WINDOW)))
+            rescheduled.append(task)
+        elif task.notify_at:
+            due_queue.schedule(task.id, task.notify_at)
+        else:
+            schedule_task(task, after=now - NOTIFICATION_WINDOW)
+    if rescheduled:
+        async with storage.transaction():
+            for task in rescheduled:
+                await storage.save_task(task)
+        logger.info(f"Moved {len(rescheduled)} notification(s) to the {now.tzinfo} timezone")
     scheduler_task = asyncio.create_task(scheduler_loop())
     logger.info("Scheduler started")
 
@@ -110,99 +331,149 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
-    global scheduler_task
     logger.info("Shutting down Home Assistant Chores Add-on...")
-    if scheduler_task:
-        scheduler_task.cancel()
-        try:
-            await scheduler_task
-        except asyncio.CancelledError:
-            pass
+    for task in (scheduler_task, outbox_task, health_task, event_listener_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    event_bus.close()
+    if ha_client:
+        await ha_client.close()
+    if storage:
+        await storage.close()
 
 
 # ============================================================================
 # Scheduler Loop
 # ============================================================================
 
+def schedule_task(task: Task, after: datetime = None) -> None:
+    """
+    Compute a task's next notification instant and queue it.
+
+    Sets task.notify_at; call before storage.save_task() so the instant is
+    persisted with the task.
+
+    Args:
+        task: The task to schedule
+        after: Earliest acceptable notification time (default: now)
+    """
+    if after is None:
+        after = get_current_time()
+    task.notify_at = compute_notify_at(task.next_due, after)
+    due_queue.schedule(task.id, task.notify_at)
+
+
+def unschedule_task(task_id: str) -> None:
+    """Remove a task from the due-time index."""
+    due_queue.remove(task_id)
+
+
+async def scheduler_tick() -> int:
+    """
+    Handle every notification slot that is due now.
+
+    Returns:
+        The number of slots handled
+    """
+    started = time.perf_counter()
+    now = get_current_time()
+    tasks_to_notify = []
+    rescheduled = []  # (task, revision of its save)
+    due = due_queue.pop_due(now)
+    if due:
+        # The new instants of all due tasks are written in a single commit,
+        # so a large burst doesn't delay the first notification
+        async with storage.lock_tasks(*(task_id for _, task_id in due)), storage.transaction():
+            for instant, task_id in due:
+                SCHEDULER_LAG.observe((to_utc(now) - instant).total_seconds())
+                task = await storage.get_task(task_id)
+                # Gone, or done/postponed since the slot was popped
+                if not task or (task.notify_at and to_utc(task.notify_at) > instant):
+                    continue
+
+                # Skip slots we woke up too late for (e.g. after a suspend)
+                if to_utc(now) - instant <= NOTIFICATION_WINDOW:
+                    tasks_to_notify.append(task)
+                else:
+                    logger.warning(f"Missed notification slot {instant} for task {task_id}")
+
+                # Remind again at the next slot until the task is done. The
+                # new instant is persisted so a restart doesn't resend.
+                schedule_task(task, after=now + timedelta(seconds=1))
+                rescheduled.append((task, await storage.save_task(task)))
+
+    # Published once the transaction has committed, so subscribers keep the
+    # new versions and instants
+    for task, revision in rescheduled:
+        _publish_task(EventType.TASK_UPDATED, task, revision)
+    if tasks_to_notify:
+        report = await dispatcher.dispatch(tasks_to_notify)
+        _publish_notification(tasks_to_notify, report, rescheduled[-1][1])
+    if due:
+        SCHEDULER_TICK_DURATION.observe(time.perf_counter() - started)
+    return len(due)
+
+
 async def scheduler_loop():
     """
     Main scheduler loop.
-    Runs every minute and checks for tasks that need notifications.
+    Sleeps until the earliest notification instant in the due-time index and
+    wakes early whenever a task is scheduled or removed.
     """
     logger.info("Scheduler loop started")
-    last_notification_minute = -1
 
     while True:
         try:
-            now = get_current_time()
-            current_minute = now.minute
-
-            # Only check once per minute
-            if current_minute != last_notification_minute:
-                last_notification_minute = current_minute
-
-                # Get all tasks and check which ones are due
-                tasks = storage.get_tasks()
-                tasks_to_notify = []
-
-                for task in tasks:
-                    # Check if task is due and it's the right time to notify
-                    if task.next_due <= now:
-                        # Check if it's the correct notification time
-                        notification_hour = 16 if is_weekday(now) else 8
-                        if now.hour == notification_hour and now.minute < 5:
-                            tasks_to_notify.append(task)
-
-                # Send notifications for due tasks
-                for task in tasks_to_notify:
-                    await send_task_notification(task)
-
-            # Sleep for 30 seconds before checking again
-            await asyncio.sleep(30)
+            await due_queue.wait(get_current_time())
+            await scheduler_tick()
 
         except Exception as e:
             logger.error(f"Error in scheduler loop: {e}", exc_info=True)
             await asyncio.sleep(30)
 
 
-async def send_task_notification(task: Task) -> None:
-    """
-    Send a notification for a task to all assigned devices.
+def _publish(event_type: EventType, revision: int, data: Any) -> None:
+    """Publish an event, or hold it back while a batch transaction is open."""
+    deferred = _deferred_events.get()
+    if deferred is None:
+        event_bus.publish(event_type, revision, data)
+    else:
+        deferred.append((event_type, revision, data))
 
-    Args:
-        task: The task to notify about
-    """
-    if not task.assigned_to:
-        logger.warning(f"Task {task.id} has no assigned devices")
-        return
 
-    devices = storage.get_devices()
-    device_map = {d.id: d for d in devices}
-
-    actions = [
-        {"action": f"TASK_DONE_{task.id}", "title": "Done"},
-        {"action": f"TASK_POSTPONE_{task.id}", "title": "Postpone"},
-    ]
-
-    for device_id in task.assigned_to:
-        device = device_map.get(device_id)
-        if not device:
-            logger.warning(f"Device {device_id} not found")
-            continue
-
-        # Send notification
-        success = await ha_client.send_notification(
-            notify_service=device.notify_service,
-            title="Household Chore Reminder",
-            message=f"Time to: {task.name}",
-            actions=actions,
-            data={"task_id": task.id},
-        )
+def _publish_task(event_type: EventType, task: Task, revision: int) -> None:
+    """Push a task change, committed at the given revision, to /events subscribers."""
+    _publish(event_type, revision, {"task": task.model_dump(mode="json")})
 
-        if success:
-            logger.info(f"Notification sent for task {task.id} to device {device_id}")
-        else:
-            logger.error(f"Failed to send notification for task {task.id} to device {device_id}")
+
+def _publish_notification(tasks: List[Task], report: DispatchReport, revision: int) -> None:
+    """Push the outcome of a notification batch to /events subscribers."""
+    event_bus.publish(
+        EventType.NOTIFICATION_SENT,
+        revision,
+        {"task_ids": [t.id for t in tasks], **report.model_dump()},
+    )
+
+
+async def health_probe_loop():
+    """
+    Keep the cached Home Assistant connection state fresh.
+    Probes only when no real call has reported the state recently.
+    """
+    while True:
+        try:
+            age = ha_client.connection_age
+            if ha_client.ha_token and (age is None or age >= HEALTH_PROBE_INTERVAL):
+                await ha_client.check_connection()
+                age = 0.0
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL - (age or 0.0))
+        except Exception as e:
+            logger.error(f"Error in health probe: {e}", exc_info=True)
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL)
 
 
 # ============================================================================
@@ -210,12 +481,22 @@ async def send_task_notification(task: Task) -> None:
 # ============================================================================
 
 @app.get("/health", response_model=HealthCheckResponse)
-async def health_check() -> HealthCheckResponse:
-    """Health check endpoint."""
-    ha_connected = await ha_client.check_connection() if ha_client else False
+async def health_check(deep: bool = False) -> HealthCheckResponse:
+    """
+    Health check endpoint.
+
+    Answers from the cached connection state kept by the background prober
+    and by real notification calls. Pass ?deep=true to force a live check.
+    """
+    if not ha_client:
+        return HealthCheckResponse(status="ok")
+    if deep:
+        await ha_client.check_connection()
+    age = ha_client.connection_age
     return HealthCheckResponse(
         status="ok",
-        ha_connected=ha_connected,
+        ha_connected=ha_client.connected,
+        ha_checked_age=round(age, 1) if age is not None else None,
     )
 
 
@@ -224,31 +505,126 @@ async def health_check() -> HealthCheckResponse:
 # ============================================================================
 
 @app.get("/tasks", response_model=List[Task])
-async def list_tasks() -> List[Task]:
-    """List all tasks."""
-    return storage.get_tasks()
+async def list_tasks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    frequency: Optional[FrequencyType] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+):
+    """
+    List tasks.
 
+    Without parameters all tasks are returned. Filters (assigned_to,
+    frequency, due_after <= next_due < due_before) and pagination return
+    tasks ordered by next_due; when more tasks match than fit in the page,
+    the X-Next-Cursor header holds the cursor for the next page.
 
-@app.post("/tasks", response_model=Task)
-async def create_task(request: TaskCreateRequest) -> Task:
+    With format=ndjson (or Accept: application/x-ndjson) the matching tasks
+    are streamed as one JSON object per line.
+
+    The ETag is the storage revision; send it back in If-None-Match to get
+    a 304 while nothing has changed.
     """
-    Create a new task.
+    etag = _etag(storage.changes.revision)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    filters = {
+        "assigned_to": assigned_to,
+        "frequency": frequency,
+        "due_after": localize(due_after) if due_after else None,
+        "due_before": localize(due_before) if due_before else None,
+    }
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    Example:
-        {
-            "name": "Vacuum the house",
-            "frequency": "weekly",
-            "assigned_to": ["johan_phone", "anna_phone"]
-        }
+    if format == "ndjson" or (format is None and NDJSON_MEDIA_TYPE in request.headers.get("accept", "")):
+        return StreamingResponse(
+            _stream_tasks(filters, after, limit), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag}
+        )
+
+    response.headers["ETag"] = etag
+    if limit is None and after is None and not any(filters.values()):
+        return await storage.get_tasks()
+
+    # Fetch one extra task to find out whether there is a next page
+    tasks = await storage.query_tasks(after=after, limit=limit + 1 if limit else None, **filters)
+    if limit is not None and len(tasks) > limit:
+        tasks = tasks[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(tasks[-1])
+    return tasks
+
+
+async def _stream_tasks(filters: dict, after: Optional[tuple], limit: Optional[int]) -> AsyncIterator[str]:
+    """Yield matching tasks as NDJSON lines, loading them a chunk at a time."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        chunk_size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+        tasks = await storage.query_tasks(after=after, limit=chunk_size, **filters)
+        for task in tasks:
+            yield task.model_dump_json() + "\n"
+        if len(tasks) < chunk_size:
+            return
+        after = (tasks[-1].next_due.timestamp(), tasks[-1].id)
+        if remaining is not None:
+            remaining -= len(tasks)
+
+
+@app.get("/tasks/changes", response_model=TaskChangesResponse)
+async def get_task_changes(request: Request, response: Response, since: int = Query(0, ge=0)):
     """
-    from uuid import uuid4
+    Get the tasks changed or deleted since a revision.
+
+    Start with since=0 (or a revision the client has not seen) to receive
+    every task with reset=true, then pass the returned revision as since on
+    the next call.
+    """
+    etag = _etag(storage.changes.revision)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    revision, reset, tasks, deleted = await storage.get_task_changes(since)
+    response.headers["ETag"] = _etag(revision)
+    return TaskChangesResponse(revision=revision, reset=reset, tasks=tasks, deleted=deleted)
+
 
+async def _get_task_or_404(task_id: str, version: Optional[int] = None) -> Task:
+    """Load a task, or raise a 404 (missing) or 409 (not at the given version)."""
+    task = await storage.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    if version is not None and task.version != version:
+        raise HTTPException(
+            status_code=409, detail=f"Task {task_id} is at version {task.version}, expected {version}"
+        )
+    return task
+
+
+async def _save_task(task: Task) -> int:
+    """Save a task unless it changed since it was read (409); returns its revision."""
+    try:
+        return await storage.save_task(task, expected_version=task.version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _create_task(request: TaskCreateRequest) -> Task:
+    """Create and store a new task."""
     task_id = str(uuid4())[:8]
     now = get_current_time()
 
     # Calculate next_due: if not provided, set to next notification time
     # For a new task, assume it's being created just after being "done"
-    next_due = compute_next_due(request.frequency, now)
+    next_due = compute_next_due(request.frequency, now, request.rrule)
 
     task = Task(
         id=task_id,
@@ -257,61 +633,220 @@ async def create_task(request: TaskCreateRequest) -> Task:
         last_done=now,
         next_due=next_due,
         assigned_to=request.assigned_to,
+        rrule=request.rrule,
     )
 
-    storage.save_task(task)
+    schedule_task(task)
+    revision = await _save_task(task)
+    _publish_task(EventType.TASK_CREATED, task, revision)
     logger.info(f"Created task {task.id}: {task.name}")
     return task
 
 
-@app.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: str) -> Task:
-    """Get a specific task by ID."""
-    task = storage.get_task(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-    return task
+# The helpers below take the task's lock around their read-modify-write, so
+# concurrent changes to one task are applied one after the other. With a
+# version, they only apply if the task is still at that version (409 if not).
 
+async def _update_task(task_id: str, request: TaskCreateRequest, version: Optional[int] = None) -> Task:
+    """Update a task's name, frequency and assignees."""
+    async with storage.lock_tasks(task_id):
+        task = await _get_task_or_404(task_id, version)
 
-@app.put("/tasks/{task_id}", response_model=Task)
-async def update_task(task_id: str, request: TaskCreateRequest) -> Task:
-    """Update a task (partially)."""
-    task = storage.get_task(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+        reschedule = task.frequency != request.frequency or task.rrule != request.rrule
 
-    # Update fields
-    task.name = request.name
-    task.frequency = request.frequency
-    task.assigned_to = request.assigned_to
+        # Update fields
+        task.name = request.name
+        task.frequency = request.frequency
+        task.assigned_to = request.assigned_to
+        task.rrule = request.rrule
 
-    storage.save_task(task)
+        # A new schedule applies from the last time the task was done
+        if reschedule:
+            task.next_due = compute_next_due(task.frequency, task.last_done, task.rrule)
+            schedule_task(task)
+
+        revision = await _save_task(task)
+    _publish_task(EventType.TASK_UPDATED, task, revision)
     logger.info(f"Updated task {task.id}: {task.name}")
     return task
 
 
-@app.post("/tasks/{task_id}/done", response_model=Task)
-async def mark_task_done(task_id: str) -> Task:
+async def _mark_task_done(task_id: str, version: Optional[int] = None) -> Task:
+    """Mark a task as done and recalculate next_due."""
+    async with storage.lock_tasks(task_id):
+        task = await _get_task_or_404(task_id, version)
+
+        now = get_current_time()
+        task.last_done = now
+        task.next_due = compute_next_due(task.frequency, now, task.rrule)
+
+        schedule_task(task)
+        revision = await _save_task(task)
+    _publish_task(EventType.TASK_DONE, task, revision)
+    logger.info(f"Task {task_id} marked as done. Next due: {task.next_due}")
+    return task
+
+
+async def _postpone_task(task_id: str, next_due: datetime, version: Optional[int] = None) -> Task:
+    """Move a task's due date."""
+    async with storage.lock_tasks(task_id):
+        task = await _get_task_or_404(task_id, version)
+
+        # A date without offset is taken as local time
+        task.next_due = localize(next_due)
+
+        schedule_task(task)
+        revision = await _save_task(task)
+    _publish_task(EventType.TASK_POSTPONED, task, revision)
+    logger.info(f"Task {task_id} postponed. New due: {task.next_due}")
+    return task
+
+
+async def _delete_task(task_id: str, version: Optional[int] = None) -> None:
+    """Delete a task."""
+    async with storage.lock_tasks(task_id):
+        task = await _get_task_or_404(task_id, version)
+
+        try:
+            revision = await storage.delete_task(task_id, expected_version=task.version)
+        except VersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        unschedule_task(task_id)
+    _publish(EventType.TASK_DELETED, revision, {"task_id": task_id})
+    logger.info(f"Task {task_id} deleted")
+
+
+async def _apply_batch_operation(operation: TaskBatchOperation) -> Optional[Task]:
+    """Apply a single batch operation; returns the resulting task, if any."""
+    if operation.op == BatchOperationType.CREATE:
+        return await _create_task(operation.task)
+    if operation.op == BatchOperationType.UPDATE:
+        return await _update_task(operation.task_id, operation.task, operation.version)
+    if operation.op == BatchOperationType.DONE:
+        return await _mark_task_done(operation.task_id, operation.version)
+    if operation.op == BatchOperationType.POSTPONE:
+        return await _postpone_task(operation.task_id, operation.next_due, operation.version)
+    await _delete_task(operation.task_id, operation.version)
+    return None
+
+
+@app.post("/tasks", response_model=Task)
+async def create_task(request: TaskCreateRequest) -> Task:
     """
-    Mark a task as done and recalculate next_due.
+    Create a new task.
 
-    This is called when the user taps "Done" on the notification.
+    Example:
+        {
+            "name": "Vacuum the house",
+            "frequency": "weekly",
+            "assigned_to": ["johan_phone", "anna_phone"]
+        }
     """
-    task = storage.get_task(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return await _create_task(request)
 
-    now = get_current_time()
-    task.last_done = now
-    task.next_due = compute_next_due(task.frequency, now)
 
-    storage.save_task(task)
-    logger.info(f"Task {task_id} marked as done. Next due: {task.next_due}")
+@app.post("/tasks/batch", response_model=TaskBatchResponse)
+async def batch_tasks(request: TaskBatchRequest) -> TaskBatchResponse:
+    """
+    Apply several task operations in one storage transaction.
+
+    All changes are persisted together once the batch is done. Operations
+    are applied in order and fail individually; each gets its own result.
+    An operation with a version only applies if the task is still at that
+    version (status 409 otherwise).
+
+    Example:
+        {
+            "operations": [
+                {"op": "create", "task": {"name": "Vacuum", "frequency": "weekly"}},
+                {"op": "done", "task_id": "abc123", "version": 4},
+                {"op": "postpone", "task_id": "def456", "next_due": "2024-12-05T16:00:00"},
+                {"op": "delete", "task_id": "ghi789"}
+            ]
+        }
+    """
+    results = []
+    # Task locks first, then the transaction; see AsyncStorage.lock_tasks
+    task_ids = [operation.task_id for operation in request.operations if operation.task_id]
+    # Events are published once the transaction has committed
+    events = []
+    token = _deferred_events.set(events)
+    try:
+        async with storage.lock_tasks(*task_ids), storage.transaction():
+            for index, operation in enumerate(request.operations):
+                try:
+                    task = await _apply_batch_operation(operation)
+                    results.append(TaskBatchResult(
+                        index=index,
+                        op=operation.op,
+                        status=200,
+                        task_id=task.id if task else operation.task_id,
+                        task=task,
+                    ))
+                except HTTPException as e:
+                    results.append(TaskBatchResult(
+                        index=index, op=operation.op, status=e.status_code, task_id=operation.task_id, error=e.detail
+                    ))
+                except Exception as e:
+                    logger.error(f"Batch operation {index} ({operation.op.value}) failed: {e}", exc_info=True)
+                    results.append(TaskBatchResult(
+                        index=index, op=operation.op, status=500, task_id=operation.task_id, error=str(e)
+                    ))
+    finally:
+        _deferred_events.reset(token)
+    for event in events:
+        event_bus.publish(*event)
+
+    logger.info(f"Applied batch of {len(results)} task operations")
+    return TaskBatchResponse(results=results)
+
+
+@app.get("/tasks/{task_id}", response_model=Task)
+async def get_task(task_id: str, request: Request, response: Response):
+    """
+    Get a specific task by ID.
+
+    The ETag is the task's version. Send it back in If-None-Match to get a
+    304 while the task is unchanged, or in If-Match on an update to make
+    sure nobody changed it in the meantime.
+    """
+    task = await _get_task_or_404(task_id)
+    etag = _etag(task.version)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
     return task
 
 
+@app.put("/tasks/{task_id}", response_model=Task)
+async def update_task(
+    task_id: str, request: TaskCreateRequest, if_match: Optional[str] = Header(None)
+) -> Task:
+    """
+    Update a task (partially).
+
+    With If-Match: "<version>" the update is rejected with 409 if the task
+    changed since that version. The same applies to done, postpone and
+    delete.
+    """
+    return await _update_task(task_id, request, _if_match_version(if_match))
+
+
+@app.post("/tasks/{task_id}/done", response_model=Task)
+async def mark_task_done(task_id: str, if_match: Optional[str] = Header(None)) -> Task:
+    """
+    Mark a task as done and recalculate next_due.
+
+    This is called when the user taps "Done" on the notification.
+    """
+    return await _mark_task_done(task_id, _if_match_version(if_match))
+
+
 @app.post("/tasks/{task_id}/postpone", response_model=Task)
-async def postpone_task(task_id: str, request: TaskPostponeRequest) -> Task:
+async def postpone_task(
+    task_id: str, request: TaskPostponeRequest, if_match: Optional[str] = Header(None)
+) -> Task:
     """
     Postpone a task to a new due date.
 
@@ -320,37 +855,70 @@ async def postpone_task(task_id: str, request: TaskPostponeRequest) -> Task:
             "next_due": "2024-12-05T16:00:00"
         }
     """
-    task = storage.get_task(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-
-    task.next_due = request.next_due
-
-    storage.save_task(task)
-    logger.info(f"Task {task_id} postponed. New due: {task.next_due}")
-    return task
+    return await _postpone_task(task_id, request.next_due, _if_match_version(if_match))
 
 
 @app.delete("/tasks/{task_id}")
-async def delete_task(task_id: str) -> dict:
+async def delete_task(task_id: str, if_match: Optional[str] = Header(None)) -> dict:
     """Delete a task."""
-    task = storage.get_task(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-
-    storage.delete_task(task_id)
-    logger.info(f"Task {task_id} deleted")
+    await _delete_task(task_id, _if_match_version(if_match))
     return {"message": f"Task {task_id} deleted"}
 
 
+# ============================================================================
+# Event Stream
+# ============================================================================
+
+@app.get("/events")
+async def stream_events(request: Request) -> StreamingResponse:
+    """
+    Stream task changes as Server-Sent Events.
+
+    Every event carries the storage revision as its id. A 'ready' event with
+    the current revision is sent first; clients that get disconnected can
+    catch up with GET /tasks/changes?since=<last revision> and reconnect.
+    """
+    queue = event_bus.subscribe()
+
+    async def generate():
+        try:
+            yield "retry: 5000\n" + Event(type=EventType.READY, revision=storage.changes.revision).to_sse()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield event.to_sse()
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ============================================================================
 # Device Endpoints
 # ============================================================================
 
 @app.get("/devices", response_model=List[Device])
-async def list_devices() -> List[Device]:
-    """List all devices."""
-    return storage.get_devices()
+async def list_devices(request: Request, response: Response):
+    """
+    List all devices.
+
+    The ETag only changes when a device does, not on task changes.
+    """
+    etag = _etag(storage.changes.devices_revision)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return await storage.get_devices()
 
 
 @app.post("/devices", response_model=Device)
@@ -365,107 +933,171 @@ async def create_device(request: DeviceCreateRequest) -> Device:
         }
     """
     # Check if device already exists
-    existing = storage.get_device(request.id)
+    existing = await storage.get_device(request.id)
     if existing:
         raise HTTPException(status_code=400, detail=f"Device {request.id} already exists")
 
     device = Device(id=request.id, notify_service=request.notify_service)
-    storage.save_device(device)
+    await storage.save_device(device)
     logger.info(f"Created device {device.id}")
     return device
 
 
 @app.get("/devices/{device_id}", response_model=Device)
-async def get_device(device_id: str) -> Device:
+async def get_device(device_id: str, request: Request, response: Response):
     """Get a specific device by ID."""
-    device = storage.get_device(device_id)
+    device = await storage.get_device(device_id)
     if not device:
         raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+    etag = _etag(storage.changes.device_revision(device_id))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
     return device
 
 
 @app.put("/devices/{device_id}", response_model=Device)
 async def update_device(device_id: str, request: DeviceCreateRequest) -> Device:
     """Update a device."""
-    device = storage.get_device(device_id)
+    device = await storage.get_device(device_id)
     if not device:
         raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
 
     device.notify_service = request.notify_service
-    storage.save_device(device)
+    await storage.save_device(device)
     logger.info(f"Updated device {device_id}")
     return device
 
 
 @app.delete("/devices/{device_id}")
 async def delete_device(device_id: str) -> dict:
-    """Delete a device."""
-    device = storage.get_device(device_id)
+    """Delete a device and unassign it from its tasks."""
+    device = await storage.get_device(device_id)
     if not device:
         raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
 
-    storage.delete_device(device_id)
-    logger.info(f"Device {device_id} deleted")
-    return {"message": f"Device {device_id} deleted"}
+    # Hold the locks of the device's tasks; retry if a task was assigned to
+    # it while waiting for them
+    while True:
+        task_ids = await storage.get_device_task_ids(device_id)
+        async with storage.lock_tasks(*task_ids):
+            if set(await storage.get_device_task_ids(device_id)) <= set(task_ids):
+                unassigned = await storage.delete_device(device_id)
+                break
+
+    for task, revision in unassigned:
+        _publish_task(EventType.TASK_UPDATED, task, revision)
+    logger.info(f"Device {device_id} deleted ({len(unassigned)} task(s) unassigned)")
+    return {"message": f"Device {device_id} deleted", "unassigned_tasks": [task.id for task, _ in unassigned]}
 
 
 # ============================================================================
 # Home Assistant Integration Endpoint
 # ============================================================================
 
-@app.post("/ha/action")
-async def handle_ha_action(request: ActionRequest) -> dict:
+async def apply_action(action: str, key: Optional[str] = None) -> dict:
     """
-    Handle notification action from Home Assistant.
+    Apply a notification action once per idempotency key.
 
-    This endpoint is called by a Home Assistant automation that listens for
-    'mobile_app_notification_action' events.
+    A repeated key gets the first delivery's result back (with
+    "duplicate": true) without the task being changed again. Deliveries
+    without a key are always applied.
+
+    Args:
+        action: The action string (see _apply_action)
+        key: Idempotency key from action_key()
+    """
+    if key is None:
+        return await _apply_action(action)
+
+    cached = action_cache.get(key)
+    if cached is None:
+        # Recheck under the task lock: a concurrent delivery may be applying it
+        async with storage.lock_tasks(action.split("_", 2)[-1]):
+            cached = action_cache.get(key)
+            if cached is None:
+                result = await _apply_action(action)
+                await action_cache.put(key, result)
+                return result
+    logger.info(f"Ignoring repeated notification action {action} ({key})")
+    return {**cached, "duplicate": True}
+
+
+async def _apply_action(action: str) -> dict:
+    """
+    Apply a notification action.
 
     The action string should be formatted as:
     - TASK_DONE_<task_id>
-    - TASK_POSTPONE_<task_id>_<new_due_date>
+    - TASK_POSTPONE_<task_id>
 
-    Example action: "TASK_DONE_abc123"
+    Raises:
+        HTTPException: 404 for unknown tasks, 400 for unknown actions
     """
-    action = request.action
+    if action.startswith("TASK_DONE_"):
+        task_id = action.replace("TASK_DONE_", "")
+        task = await _mark_task_done(task_id)
+        return {
+            "status": "ok",
+            "action": "task_done",
+            "task_id": task_id,
+            "next_due": task.next_due.isoformat(),
+        }
 
+    elif action.startswith("TASK_POSTPONE_"):
+        # Format: TASK_POSTPONE_<task_id>
+        # The actual postpone datetime comes from a follow-up request
+        # For now, we implement a default postpone (+ 1 day at notification time)
+        task_id = action.replace("TASK_POSTPONE_", "")
+        now = get_current_time()
+        new_due = get_notification_time(now + timedelta(days=1))
+        await _postpone_task(task_id, new_due)
+
+        return {
+            "status": "ok",
+            "action": "task_postponed",
+            "task_id": task_id,
+            "new_due": new_due.isoformat(),
+        }
+
+    else:
+        logger.warning(f"Unknown action: {action}")
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+
+
+async def handle_notification_action_event(event: dict) -> None:
+    """Apply a mobile_app_notification_action event received over the WebSocket API."""
+    data = event.get("data") or {}
+    action = data.get("action") or ""
+    # The event fires for every actionable notification, not just ours
+    if not action.startswith(("TASK_DONE_", "TASK_POSTPONE_")):
+        return
+    tag = data.get("tag") or (data.get("action_data") or {}).get("tag")
+    key = action_key(action, tag, (event.get("context") or {}).get("id"))
     try:
-        if action.startswith("TASK_DONE_"):
-            task_id = action.replace("TASK_DONE_", "")
-            task = await mark_task_done(task_id)
-            return {
-                "status": "ok",
-                "action": "task_done",
-                "task_id": task_id,
-                "next_due": task.next_due.isoformat(),
-            }
-
-        elif action.startswith("TASK_POSTPONE_"):
-            # Format: TASK_POSTPONE_<task_id>
-            # The actual postpone datetime comes from a follow-up request
-            # For now, we implement a default postpone (+ 1 day at notification time)
-            task_id = action.replace("TASK_POSTPONE_", "")
-            task = storage.get_task(task_id)
-            if not task:
-                raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-
-            now = get_current_time()
-            new_due = get_notification_time(now + __import__("datetime").timedelta(days=1))
-            task.next_due = new_due
-            storage.save_task(task)
-
-            logger.info(f"Task {task_id} postponed to {new_due}")
-            return {
-                "status": "ok",
-                "action": "task_postponed",
-                "task_id": task_id,
-                "new_due": new_due.isoformat(),
-            }
+        result = await apply_action(action, key)
+        logger.info(f"Applied notification action {action}: {result['action']}")
+    except HTTPException as e:
+        logger.warning(f"Ignoring notification action {action}: {e.detail}")
 
-        else:
-            logger.warning(f"Unknown action: {action}")
-            raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
 
+@app.post("/ha/action")
+async def handle_ha_action(request: ActionRequest) -> dict:
+    """
+    Handle notification action from Home Assistant.
+
+    Notification actions normally arrive over the WebSocket API (see
+    HAEventListener). This endpoint serves setups that forward them with an
+    automation instead. Forward the notification's tag (or the event's
+    context id) so repeated deliveries are only applied once.
+
+    Example: {"action": "TASK_DONE_abc123", "tag": "chores-abc123-7"}
+    """
+    action = request.action
+
+    try:
+        return await apply_action(action, action_key(action, request.tag, request.event_id))
     except HTTPException:
         raise
     except Exception as e:
@@ -473,6 +1105,18 @@ async def handle_ha_action(request: ActionRequest) -> dict:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================================================
+# Metrics Endpoint
+# ============================================================================
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics."""
+    TASKS.set(await storage.count_tasks())
+    DEVICES.set(await storage.count_devices())
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # ============================================================================
 # Root Endpoint
 # ============================================================================
@@ -0,0 +1,79 @@
+"""
+Prometheus metrics for the add-on, served at /metrics.
+
+Covers HTTP request latency per route, storage operation durations and bytes,
+scheduler tick duration and lag, notification latency and outcome per notify
+service, and the number of tasks and devices.
+"""
+import functools
+import time
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest  # noqa: F401
+
+# Buckets for fast in-process operations (storage, scheduler ticks)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "chores_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+
+STORAGE_OPERATION_DURATION = Histogram(
+    "chores_storage_operation_duration_seconds",
+    "Duration of storage operations",
+    ["backend", "operation"],
+    buckets=FAST_BUCKETS,
+)
+STORAGE_BYTES_WRITTEN = Counter(
+    "chores_storage_written_bytes_total",
+    "Bytes written to storage files",
+    ["file"],
+)
+STORAGE_BYTES_READ = Counter(
+    "chores_storage_read_bytes_total",
+    "Bytes read from storage files",
+    ["file"],
+)
+
+SCHEDULER_TICK_DURATION = Histogram(
+    "chores_scheduler_tick_duration_seconds",
+    "Time spent handling due notification slots per scheduler wake-up",
+    buckets=FAST_BUCKETS + (5.0, 10.0, 30.0),
+)
+SCHEDULER_LAG = Histogram(
+    "chores_scheduler_lag_seconds",
+    "Delay between a notification slot and the scheduler handling it",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+NOTIFICATION_LATENCY = Histogram(
+    "chores_notification_duration_seconds",
+    "Latency of notify service calls",
+    ["service", "outcome"],
+)
+NOTIFICATIONS = Counter(
+    "chores_notifications_total",
+    "Notify service calls by outcome",
+    ["service", "outcome"],
+)
+
+TASKS = Gauge("chores_tasks", "Number of tasks")
+DEVICES = Gauge("chores_devices", "Number of devices")
+
+
+def timed_storage(operation: str) -> Callable:
+    """Decorate a storage method to record its duration."""
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                STORAGE_OPERATION_DURATION.labels(type(self).__name__, operation).observe(
+                    time.perf_counter() - started
+                )
+        return wrapper
+    return decorator
@@ -3,9 +3,11 @@ Data models for the Household Chores add-on.
 """
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.recurrence import validate_rrule
 
 
 class FrequencyType(str, Enum):
@@ -15,6 +17,7 @@ class FrequencyType(str, Enum):
     MONTHLY = "monthly"
     QUARTERLY = "quarterly"
     YEARLY = "yearly"
+    CUSTOM = "custom"  # Follows the task's RRULE
 
 
 class Task(BaseModel):
@@ -25,6 +28,9 @@ class Task(BaseModel):
     last_done: datetime = Field(..., description="When the task was last completed")
     next_due: datetime = Field(..., description="When the task is next due")
     assigned_to: List[str] = Field(default_factory=list, description="List of device IDs to notify")
+    notify_at: Optional[datetime] = Field(None, description="Exact instant of the next reminder notification")
+    rrule: Optional[str] = Field(None, description="RFC 5545 recurrence rule, used when frequency is 'custom'")
+    version: int = Field(0, description="Incremented by storage on every save")
 
 
 class TaskCreateRequest(BaseModel):
@@ -32,14 +38,79 @@ class TaskCreateRequest(BaseModel):
     name: str
     frequency: FrequencyType
     assigned_to: List[str] = Field(default_factory=list)
+    rrule: Optional[str] = None  # Required when frequency is 'custom', e.g. "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU"
     # Optional: if not provided, next_due will be calculated based on current time
 
+    @field_validator("rrule")
+    @classmethod
+    def check_rrule(cls, value: Optional[str]) -> Optional[str]:
+        """Reject recurrence rules that can't be expanded."""
+        return validate_rrule(value) if value else None
+
+    @model_validator(mode="after")
+    def check_custom_frequency(self) -> "TaskCreateRequest":
+        """Custom frequency needs a rule; other frequencies ignore it."""
+        if self.frequency == FrequencyType.CUSTOM and not self.rrule:
+            raise ValueError("rrule is required when frequency is 'custom'")
+        if self.frequency != FrequencyType.CUSTOM:
+            self.rrule = None
+        return self
+
 
 class TaskPostponeRequest(BaseModel):
     """Request body for postponing a task."""
     next_due: datetime
 
 
+class BatchOperationType(str, Enum):
+    """Operations supported by the batch endpoint."""
+    CREATE = "create"
+    UPDATE = "update"
+    DONE = "done"
+    POSTPONE = "postpone"
+    DELETE = "delete"
+
+
+class TaskBatchOperation(BaseModel):
+    """A single operation in a batch request."""
+    op: BatchOperationType
+    task_id: Optional[str] = None  # Required for everything except create
+    task: Optional[TaskCreateRequest] = None  # Required for create and update
+    next_due: Optional[datetime] = None  # Required for postpone
+    version: Optional[int] = None  # Only apply if the task is still at this version
+
+    @model_validator(mode="after")
+    def check_fields(self) -> "TaskBatchOperation":
+        """Make sure each operation carries the fields it needs."""
+        if self.op != BatchOperationType.CREATE and not self.task_id:
+            raise ValueError(f"task_id is required for '{self.op.value}'")
+        if self.op in (BatchOperationType.CREATE, BatchOperationType.UPDATE) and self.task is None:
+            raise ValueError(f"task is required for '{self.op.value}'")
+        if self.op == BatchOperationType.POSTPONE and self.next_due is None:
+            raise ValueError("next_due is required for 'postpone'")
+        return self
+
+
+class TaskBatchRequest(BaseModel):
+    """Request body for applying several task operations at once."""
+    operations: List[TaskBatchOperation]
+
+
+class TaskBatchResult(BaseModel):
+    """Outcome of one batch operation."""
+    index: int
+    op: BatchOperationType
+    status: int  # HTTP status the single-task endpoint would have returned
+    task_id: Optional[str] = None
+    task: Optional[Task] = None
+    error: Optional[str] = None
+
+
+class TaskBatchResponse(BaseModel):
+    """Response body of the batch endpoint."""
+    results: List[TaskBatchResult]
+
+
 class Device(BaseModel):
     """Device model representing a phone."""
     id: str = Field(..., description="Unique identifier for the device (e.g. 'johan_phone')")
@@ -50,3 +121,11 @@ class DeviceCreateRequest(BaseModel):
     """Request body for creating a new device."""
     id: str
     notify_service: str
+
+
+class TaskChangesResponse(BaseModel):
+    """Response body of GET /tasks/changes."""
+    revision: int  # Pass as ?since= on the next call
+    reset: bool = False  # True: tasks holds every task; replace the local copy
+    tasks: List[Task] = []
+    deleted: List[str] = []
@@ -0,0 +1,257 @@
+"""
+Notification dispatch for due tasks.
+Fans notifications out concurrently over all (task, device) pairs, bounded by
+a semaphore so a burst of due tasks doesn't flood Home Assistant. Failed
+deliveries are handed to the outbox for retry.
+
+In digest mode each device gets one notification listing all of its due
+tasks instead of one per task.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.ha_client import HAClient
+from app.models import Device, Task
+from app.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Default number of notify service calls in flight at once
+DEFAULT_NOTIFY_CONCURRENCY = 8
+
+# Most tasks a digest offers a Done button for; Android shows at most three
+DEFAULT_DIGEST_THRESHOLD = 3
+
+
+class DispatchReport(BaseModel):
+    """Outcome of one notification batch."""
+    tasks: int = 0
+    sent: int = 0
+    failed: int = 0
+    queued: int = 0
+    skipped: int = 0
+    digests: int = 0  # Notifications that covered several tasks
+    duration: float = 0.0
+
+
+def notification_tag(task: Task) -> str:
+    """
+    Tag identifying one reminder for a task.
+
+    It changes whenever the task does, so repeated deliveries of an action
+    from the same reminder share a tag and can be deduplicated.
+    """
+    return f"chores-{task.id}-{task.version}"
+
+
+def build_task_notification(task: Task) -> dict:
+    """Build the notify service arguments for a task reminder."""
+    tag = notification_tag(task)
+    return {
+        "title": "Household Chore Reminder",
+        "message": f"Time to: {task.name}",
+        "actions": [
+            {"action": f"TASK_DONE_{task.id}", "title": "Done"},
+            {"action": f"TASK_POSTPONE_{task.id}", "title": "Postpone"},
+        ],
+        # Android reports the tag with the action event, iOS the action_data
+        "data": {"task_id": task.id, "tag": tag, "action_data": {"tag": tag}},
+    }
+
+
+def build_digest_notification(tasks: List[Task], url: Optional[str] = None) -> dict:
+    """
+    Build the notify service arguments for a reminder covering several tasks.
+
+    Args:
+        tasks: The due tasks, listed in the message
+        url: Link to the full task list. When given, the notification opens
+            it instead of offering a Done button per task.
+    """
+    versions = ",".join(f"{t.id}-{t.version}" for t in sorted(tasks, key=lambda t: t.id))
+    tag = f"chores-digest-{hashlib.sha1(versions.encode()).hexdigest()[:12]}"
+    data = {"task_ids": [t.id for t in tasks], "tag": tag, "action_data": {"tag": tag}}
+    actions = None
+    if url:
+        data["url"] = url  # iOS
+        data["clickAction"] = url  # Android
+    else:
+        actions = [{"action": f"TASK_DONE_{t.id}", "title": f"Done: {t.name}"} for t in tasks]
+    return {
+        "title": f"{len(tasks)} Household Chores Due",
+        "message": "\n".join(f"• {t.name}" for t in tasks),
+        "actions": actions,
+        "data": data,
+    }
+
+
+class NotificationDispatcher:
+    """Send task reminders to assigned devices with bounded concurrency."""
+
+    def __init__(
+        self,
+        storage,
+        ha_client: HAClient,
+        concurrency: int = DEFAULT_NOTIFY_CONCURRENCY,
+        outbox: Optional[Outbox] = None,
+        digest: bool = False,
+        digest_threshold: int = DEFAULT_DIGEST_THRESHOLD,
+        digest_url: Optional[str] = None,
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            storage: AsyncStorage used to resolve device IDs
+            ha_client: Client used to call the notify services
+            concurrency: Maximum number of notify calls in flight at once
+            outbox: Retry queue for failed deliveries (None: drop them)
+            digest: Send each device one notification for all its due tasks
+            digest_threshold: Most tasks in a digest with a Done button per
+                task. Past it a device gets a digest linking to digest_url,
+                or one notification per task if there is no URL.
+            digest_url: Link to the full task list for large digests
+        """
+        self.storage = storage
+        self.ha_client = ha_client
+        self.concurrency = max(1, concurrency)
+        self.outbox = outbox
+        self.digest = digest
+        self.digest_threshold = max(1, digest_threshold)
+        self.digest_url = digest_url
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _resolve(self, tasks: List[Task], report: DispatchReport) -> List[Tuple[Task, Device]]:
+        """Expand tasks into (task, device) pairs, skipping unknown devices."""
+        device_map = await self.storage.get_devices_by_id(
+            device_id for task in tasks for device_id in task.assigned_to
+        )
+        pairs = []
+        missing: Dict[str, int] = {}
+        for task in tasks:
+            if not task.assigned_to:
+                logger.warning(f"Task {task.id} has no assigned devices")
+                continue
+            for device_id in task.assigned_to:
+                device = device_map.get(device_id)
+                if not device:
+                    missing[device_id] = missing.get(device_id, 0) + 1
+                    report.skipped += 1
+                    continue
+                pairs.append((task, device))
+        for device_id, count in missing.items():
+            logger.warning(f"Device {device_id} not found ({count} notification(s) skipped)")
+        return pairs
+
+    def _plan(self, pairs: List[Tuple[Task, Device]]) -> List[Tuple[List[Task], Device]]:
+        """
+        Decide which tasks go into each notification.
+
+        Without digest mode every pair is its own notification. In digest
+        mode a device's tasks share one notification, unless there are more
+        than the threshold and no URL to link to.
+        """
+        if not self.digest:
+            return [([task], device) for task, device in pairs]
+
+        by_device: Dict[str, Tuple[Device, List[Task]]] = {}
+        for task, device in pairs:
+            by_device.setdefault(device.id, (device, []))[1].append(task)
+
+        plan = []
+        for device, tasks in by_device.values():
+            if len(tasks) <= self.digest_threshold or self.digest_url:
+                plan.append((tasks, device))
+            else:
+                plan.extend(([task], device) for task in tasks)
+        return plan
+
+    def _build(self, tasks: List[Task]) -> dict:
+        """Notify service payload for one planned notification."""
+        if len(tasks) == 1:
+            return self.ha_client.build_payload(**build_task_notification(tasks[0]))
+        url = self.digest_url if len(tasks) > self.digest_threshold else None
+        return self.ha_client.build_payload(**build_digest_notification(tasks, url))
+
+    async def _send(self, tasks: List[Task], device: Device) -> str:
+        """
+        Send one notification, waiting for a free slot first.
+
+        Returns:
+            'sent', 'queued' (handed to the outbox) or 'failed'
+        """
+        payload = self._build(tasks)
+        label = f"task {tasks[0].id}" if len(tasks) == 1 else f"{len(tasks)} tasks"
+
+        # While Home Assistant is known to be down, go straight to the outbox
+        if self.outbox is not None and not self.outbox.breaker.allow():
+            await self.outbox.add(device.notify_service, payload, tasks=tasks)
+            return "queued"
+
+        async with self._semaphore:
+            result = await self.ha_client.deliver(device.notify_service, payload)
+
+        if self.outbox is not None:
+            # A non-retryable error (a 4xx for a stale service) means Home
+            # Assistant answered, so it doesn't count against the breaker
+            self.outbox.breaker.record(result.success or not result.retryable)
+        if result.success:
+            logger.info(f"Notification sent for {label} to device {device.id}")
+            return "sent"
+
+        logger.error(f"Failed to send notification for {label} to device {device.id}")
+        if self.outbox is not None and result.retryable:
+            await self.outbox.add(device.notify_service, payload, result, tasks=tasks)
+            return "queued"
+        return "failed"
+
+    async def dispatch(self, tasks: List[Task]) -> DispatchReport:
+        """
+        Notify every assigned device of every task concurrently.
+
+        In digest mode each device gets one notification for all its tasks
+        (see _plan).
+
+        Args:
+            tasks: Tasks to send reminders for
+
+        Returns:
+            A report with timing and per-notification outcome counts
+        """
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        started = time.monotonic()
+        report = DispatchReport(tasks=len(tasks))
+        pairs = await self._resolve(tasks, report)
+        plan = self._plan(pairs)
+        report.digests = sum(1 for planned, _ in plan if len(planned) > 1)
+
+        results = await asyncio.gather(
+            *(self._send(planned, device) for planned, device in plan),
+            return_exceptions=True,
+        )
+        for result in results:
+            if result == "sent":
+                report.sent += 1
+            elif result == "queued":
+                report.queued += 1
+            else:
+                if isinstance(result, BaseException):
+                    logger.error(f"Unexpected error sending notification: {result}")
+                report.failed += 1
+
+        report.duration = time.monotonic() - started
+        if pairs:
+            logger.info(
+                f"Notification batch: {report.tasks} tasks, {report.sent} sent ({report.digests} digests), "
+                f"{report.failed} failed, {report.queued} queued for retry, "
+                f"{report.skipped} skipped in {report.duration:.2f}s"
+            )
+        return report
@@ -0,0 +1,320 @@
+"""
+Durable outbox for notifications that could not be delivered.
+
+Failed notify calls are recorded in outbox.json under the data directory and
+retried by a background worker with exponential backoff and jitter. A circuit
+breaker stops hammering Home Assistant while it is down and lets a single
+probe through before the queue is drained again.
+
+Task reminders remember the state of their tasks when they were sent. A
+newer reminder for a task replaces the pending one, and a reminder whose task
+has been done, postponed or rescheduled since is dropped instead of resent.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel, Field
+
+from app.ha_client import HAClient, NotificationResult
+from app.models import Task
+from app.storage import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Retry policy
+BASE_RETRY_DELAY = 5.0          # seconds before the first retry
+MAX_RETRY_DELAY = 15 * 60.0     # cap on the backoff
+MAX_OUTBOX_AGE = 24 * 3600.0    # give up on notifications older than this
+
+# Circuit breaker policy
+BREAKER_FAILURE_THRESHOLD = 5   # consecutive failures before opening
+BREAKER_RESET_TIMEOUT = 60.0    # seconds before a probe is let through
+
+
+class OutboxTask(BaseModel):
+    """State of a task when a reminder for it was sent."""
+    id: str
+    version: int
+    last_done: datetime
+    notify_at: Optional[datetime] = None
+
+    @classmethod
+    def from_task(cls, task: Task) -> "OutboxTask":
+        return cls(id=task.id, version=task.version, last_done=task.last_done, notify_at=task.notify_at)
+
+    def is_current(self, task: Optional[Task]) -> bool:
+        """False once the task is gone, done or rescheduled since the reminder."""
+        return task is not None and task.last_done == self.last_done and task.notify_at == self.notify_at
+
+
+class OutboxEntry(BaseModel):
+    """A notification waiting to be retried."""
+    id: str = Field(default_factory=lambda: str(uuid4())[:8])
+    notify_service: str
+    payload: Dict[str, Any]
+    tasks: List[OutboxTask] = []  # Tasks the notification reminds of
+    attempts: int = 0
+    created: float = Field(default_factory=time.time)
+    next_attempt: float = Field(default_factory=time.time)
+    last_error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """
+    Track consecutive failures of Home Assistant calls.
+
+    closed: calls go through. open: calls are refused until the reset timeout
+    has passed. half_open: one probe call is allowed; its outcome closes or
+    re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        """Initialize a closed breaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Current state: 'closed', 'open' or 'half_open'."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        """Seconds until a probe will be allowed (0 if calls are allowed now)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success: bool) -> None:
+        """
+        Record the outcome of a call.
+
+        Args:
+            success: Home Assistant handled the call; pass True for errors
+                that aren't its fault (a rejected payload, an unknown service)
+        """
+        self._probing = False
+        if success:
+            if self.opened_at is not None:
+                logger.info("Home Assistant reachable again, closing circuit breaker")
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Opening circuit breaker after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class Outbox:
+    """Persistent retry queue for undelivered notifications."""
+
+    def __init__(
+        self,
+        data_dir: str,
+        ha_client: HAClient,
+        run: Callable[..., Awaitable[Any]],
+        breaker: Optional[CircuitBreaker] = None,
+        storage=None,
+    ):
+        """
+        Initialize the outbox and load pending entries from disk.
+
+        Args:
+            data_dir: Directory for outbox.json
+            ha_client: Client used to retry deliveries
+            run: Coroutine running a blocking call off the event loop
+                (AsyncStorage.run), used to write the file
+            breaker: Circuit breaker shared with direct sends
+            storage: AsyncStorage used to check that queued reminders are
+                still current (None: always resend them)
+        """
+        self.outbox_file = Path(data_dir) / "outbox.json"
+        self.ha_client = ha_client
+        self._run = run
+        self.storage = storage
+        self.breaker = breaker or CircuitBreaker()
+        self._entries: Dict[str, OutboxEntry] = {}
+        self._wakeup = asyncio.Event()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        """Load pending entries from disk."""
+        try:
+            with open(self.outbox_file, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            logger.error(f"Could not parse {self.outbox_file.name}: {e}")
+            return
+        for item in data.get("entries", []):
+            entry = OutboxEntry(**item)
+            self._entries[entry.id] = entry
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} pending notifications from outbox")
+
+    async def _save(self) -> None:
+        """Persist pending entries."""
+        snapshot = {"entries": [e.model_dump() for e in self._entries.values()]}
+        await self._run(write_json_atomic, self.outbox_file, snapshot)
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        """Delay before the next attempt: exponential with full jitter."""
+        return random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempts))
+
+    async def add(
+        self,
+        notify_service: str,
+        payload: Dict[str, Any],
+        result: Optional[NotificationResult] = None,
+        tasks: Optional[List[Task]] = None,
+    ) -> None:
+        """
+        Queue a notification for retry.
+
+        Pending reminders to the same service for any of the tasks are
+        replaced: the tasks have been rescheduled since they were sent.
+
+        Args:
+            notify_service: Service the notification was meant for
+            payload: Service payload to resend
+            result: Outcome of the failed attempt, if one was made
+            tasks: Tasks the notification reminds of
+        """
+        entry = OutboxEntry(
+            notify_service=notify_service,
+            payload=payload,
+            tasks=[OutboxTask.from_task(task) for task in tasks or []],
+        )
+        if result is not None:
+            entry.attempts = 1
+            entry.last_error = result.error
+            entry.next_attempt = time.time() + max(self.backoff(0), result.retry_after or 0.0)
+
+        task_ids = {task.id for task in entry.tasks}
+        replaced = [
+            e for e in self._entries.values()
+            if e.notify_service == notify_service and task_ids.intersection(t.id for t in e.tasks)
+        ]
+        for old in replaced:
+            logger.info(f"Replacing queued notification {old.id} to {notify_service} with {entry.id}")
+            del self._entries[old.id]
+
+        self._entries[entry.id] = entry
+        await self._save()
+        self._wakeup.set()
+        logger.info(f"Queued notification to {notify_service} for retry ({len(self._entries)} pending)")
+
+    def _due_entries(self, now: float) -> List[OutboxEntry]:
+        """Entries whose next attempt has come, oldest first."""
+        due = [e for e in self._entries.values() if e.next_attempt <= now]
+        return sorted(due, key=lambda e: e.next_attempt)
+
+    async def _is_current(self, entry: OutboxEntry) -> bool:
+        """Check that none of an entry's tasks changed since it was sent."""
+        if self.storage is None:
+            return True
+        for queued in entry.tasks:
+            if not queued.is_current(await self.storage.get_task(queued.id)):
+                return False
+        return True
+
+    async def _retry(self, entry: OutboxEntry) -> None:
+        """Retry one entry and update or drop it based on the outcome."""
+        # Resending a reminder for a task that was done since would let its
+        # Done action advance the task a second time
+        if not await self._is_current(entry):
+            logger.info(f"Dropping outdated notification {entry.id} to {entry.notify_service}")
+            del self._entries[entry.id]
+            await self._save()
+            return
+
+        result = await self.ha_client.deliver(entry.notify_service, entry.payload)
+        # Only outages (5xx, 429, timeouts, connection errors) trip the breaker
+        self.breaker.record(result.success or not result.retryable)
+        entry.attempts += 1
+
+        if result.success:
+            logger.info(f"Delivered queued notification {entry.id} after {entry.attempts} attempts")
+            del self._entries[entry.id]
+        elif not result.retryable:
+            logger.error(f"Dropping notification {entry.id} to {entry.notify_service}: {result.error}")
+            del self._entries[entry.id]
+        else:
+            entry.last_error = result.error
+            entry.next_attempt = time.time() + max(self.backoff(entry.attempts), result.retry_after or 0.0)
+        await self._save()
+
+    async def _expire(self, now: float) -> None:
+        """Drop entries that are too old to be useful."""
+        expired = [e for e in self._entries.values() if now - e.created > MAX_OUTBOX_AGE]
+        for entry in expired:
+            logger.warning(f"Giving up on notification {entry.id} to {entry.notify_service} after {entry.attempts} attempts")
+            del self._entries[entry.id]
+        if expired:
+            await self._save()
+
+    def _next_wakeup(self, now: float) -> Optional[float]:
+        """Seconds until the worker has something to do (None: nothing pending)."""
+        if not self._entries:
+            return None
+        delay = min(e.next_attempt for e in self._entries.values()) - now
+        return max(delay, self.breaker.retry_in(), 0.0)
+
+    async def run(self) -> None:
+        """
+        Background worker retrying queued notifications.
+
+        Entries are retried one at a time, so a backlog built up while Home
+        Assistant was down drains gradually instead of all at once.
+        """
+        logger.info("Outbox worker started")
+        while True:
+            try:
+                now = time.time()
+                await self._expire(now)
+                for entry in self._due_entries(now):
+                    if not self.breaker.allow():
+                        break
+                    await self._retry(entry)
+
+                self._wakeup.clear()
+                timeout = self._next_wakeup(time.time())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in outbox worker: {e}", exc_info=True)
+                await asyncio.sleep(BASE_RETRY_DELAY)
@@ -0,0 +1,83 @@
+"""
+RFC 5545 recurrence rules (RRULE) for tasks with custom schedules.
+
+Rules are parsed with python-dateutil and expanded on local calendar dates;
+the time of day still comes from the notification slot. Parsed rules and
+computed occurrences are kept in LRU caches, so the scheduler doesn't
+re-expand a rule every time it needs the next due date.
+
+Examples:
+    Every 2nd Tuesday:              FREQ=WEEKLY;INTERVAL=2;BYDAY=TU
+    2nd Tuesday of every month:     FREQ=MONTHLY;BYDAY=+2TU
+    First weekday of the month:     FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=1
+
+Interval-based rules count from RRULE_ANCHOR unless the rule carries its own
+DTSTART (without TZID, i.e. floating local time).
+"""
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Union
+
+from dateutil.rrule import rrule, rruleset, rrulestr
+
+# Default DTSTART for rules without one (a Monday)
+RRULE_ANCHOR = datetime(2024, 1, 1)
+
+# Number of parsed rules and of (rule, date) lookups kept in memory
+RRULE_CACHE_SIZE = 256
+OCCURRENCE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=RRULE_CACHE_SIZE)
+def parse_rrule(rule: str) -> Union[rrule, rruleset]:
+    """
+    Parse an RRULE string.
+
+    The returned rule caches the occurrences it has generated, and the rule
+    itself is cached per string.
+
+    Raises:
+        ValueError: If the rule cannot be parsed
+    """
+    return rrulestr(rule, dtstart=RRULE_ANCHOR, cache=True)
+
+
+@lru_cache(maxsize=OCCURRENCE_CACHE_SIZE)
+def next_occurrence(rule: str, after: date) -> date:
+    """
+    Get the first date strictly after a given date on which a rule occurs.
+
+    Args:
+        rule: RRULE string
+        after: Local date to search from (exclusive)
+
+    Returns:
+        The next occurrence date
+
+    Raises:
+        ValueError: If the rule has no further occurrences
+    """
+    occurrence = parse_rrule(rule).after(datetime.combine(after, time.max))
+    if occurrence is None:
+        raise ValueError(f"Recurrence rule has no occurrences after {after}: {rule}")
+    return occurrence.date()
+
+
+def validate_rrule(rule: str) -> str:
+    """
+    Check that a rule can be used for a recurring task.
+
+    Returns:
+        The rule, stripped of surrounding whitespace
+
+    Raises:
+        ValueError: If the rule is invalid or finite
+    """
+    rule = rule.strip()
+    if "COUNT=" in rule.upper() or "UNTIL=" in rule.upper():
+        raise ValueError("Recurrence rules with COUNT or UNTIL are not supported")
+    try:
+        next_occurrence(rule, RRULE_ANCHOR.date())
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid recurrence rule {rule!r}: {e}")
+    return rule
@@ -2,123 +2,341 @@
 Scheduler for tasks and notifications.
 Handles computing next_due dates and triggering notifications.
 """
+import asyncio
+import calendar
+import heapq
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from zoneinfo import ZoneInfo
 
-from app.models import FrequencyType, Task
+from app.models import FrequencyType
+from app.recurrence import next_occurrence
 
 logger = logging.getLogger(__name__)
 
-# Timezone for scheduling (Europe/Stockholm - CET/CEST)
+# Timezone for scheduling (default Europe/Stockholm - CET/CEST).
+# Changed at startup from the add-on's timezone option via set_timezone().
 TZ = ZoneInfo("Europe/Stockholm")
 
 # Notification times
 WEEKDAY_NOTIFICATION_HOUR = 16  # 16:00 on weekdays
 WEEKEND_NOTIFICATION_HOUR = 8   # 08:00 on weekends
 
+# How late a notification may still be sent after its slot
+NOTIFICATION_WINDOW = timedelta(minutes=5)
+
+# Upper bound on a single scheduler sleep, so wall-clock changes (NTP,
+# suspend) are picked up eventually
+MAX_SCHEDULER_SLEEP = 3600.0
+
+
+def set_timezone(name: str) -> None:
+    """
+    Set the timezone used for scheduling.
+
+    Args:
+        name: IANA timezone name (e.g. 'Europe/Stockholm')
+
+    Raises:
+        ZoneInfoNotFoundError: If the timezone is unknown
+    """
+    global TZ
+    TZ = ZoneInfo(name)
+    logger.info(f"Scheduling timezone set to {name}")
+
 
 def get_current_time() -> datetime:
     """Get current time in the configured timezone."""
     return datetime.now(tz=TZ)
 
 
+def localize(dt: datetime) -> datetime:
+    """
+    Express a datetime in the configured timezone.
+    Naive datetimes (e.g. a postpone date without offset) are taken as local
+    wall-clock time.
+    """
+    if dt.tzinfo is None:
+        return _wall_clock(dt.date(), dt.time())
+    return dt.astimezone(TZ)
+
+
+def to_utc(dt: datetime) -> datetime:
+    """
+    Convert a datetime to UTC.
+
+    Aware datetimes sharing a tzinfo are compared and subtracted by wall
+    clock, which is off by an hour across a DST change. Instants are
+    therefore always compared in UTC.
+    """
+    return localize(dt).astimezone(timezone.utc)
+
+
+def _wall_clock(day: date, at: time) -> datetime:
+    """
+    Build the aware datetime for a local date and wall-clock time.
+
+    Times inside a DST gap (e.g. 02:30 on the spring-forward night) are moved
+    forward by the gap. Ambiguous times in a DST fold resolve to the first
+    occurrence, so a slot is never hit twice.
+    """
+    local = datetime.combine(day, at, tzinfo=TZ)
+    # Round-tripping through UTC normalizes non-existent times
+    return local.astimezone(timezone.utc).astimezone(TZ)
+
+
 def is_weekday(dt: datetime) -> bool:
     """Check if a datetime is a weekday (Monday=0, Sunday=6)."""
     return dt.weekday() < 5
 
 
+def get_notification_hour(day: date) -> int:
+    """Get the notification hour for a date (16 on weekdays, 8 on weekends)."""
+    return WEEKDAY_NOTIFICATION_HOUR if is_weekday(day) else WEEKEND_NOTIFICATION_HOUR
+
+
+def get_notification_instant(day: date) -> datetime:
+    """Get the exact notification instant on a local date."""
+    return _wall_clock(day, time(get_notification_hour(day)))
+
+
 def get_notification_time(dt: datetime) -> datetime:
     """
     Get the notification time for a given date.
     If weekday: return time at 16:00.
     If weekend: return time at 08:00.
     """
-    hour = WEEKDAY_NOTIFICATION_HOUR if is_weekday(dt) else WEEKEND_NOTIFICATION_HOUR
-    return dt.replace(hour=hour, minute=0, second=0, microsecond=0)
+    return get_notification_instant(localize(dt).date())
+
+
+def is_notification_slot(dt: datetime) -> bool:
+    """Return True if dt is the notification time of its local date."""
+    return to_utc(get_notification_time(dt)) == to_utc(dt)
+
+
+def get_next_notification_time(after: datetime) -> datetime:
+    """
+    Get the first notification slot at or after a given instant.
+
+    Args:
+        after: Earliest acceptable instant
+
+    Returns:
+        The notification time (16:00 weekdays, 08:00 weekends) on the same day
+        if it has not passed yet, otherwise on the following day
+    """
+    after_utc = to_utc(after)
+    day = after_utc.astimezone(TZ).date()
+    slot = get_notification_instant(day)
+    if to_utc(slot) < after_utc:
+        slot = get_notification_instant(day + timedelta(days=1))
+    return slot
 
 
-def compute_next_due(frequency: FrequencyType, last_done: datetime) -> datetime:
+def compute_notify_at(next_due: datetime, after: datetime) -> datetime:
+    """
+    Compute a task's next notification instant.
+
+    Args:
+        next_due: When the task is due
+        after: Earliest acceptable notification time
+
+    Returns:
+        The first notification slot at or after both next_due and after
+    """
+    return get_next_notification_time(max(to_utc(next_due), to_utc(after)))
+
+
+def add_months(day: date, months: int) -> date:
+    """Add months to a date, clamping to the last day of the target month."""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def compute_next_due(frequency: FrequencyType, last_done: datetime, rrule: Optional[str] = None) -> datetime:
     """
     Compute the next due date for a task based on frequency.
 
+    The period is added to the local calendar date of last_done, so DST
+    changes in between never shift the result by an hour.
+
     Args:
         frequency: The task frequency (daily, weekly, etc.)
         last_done: When the task was last completed
+        rrule: Recurrence rule, required for the 'custom' frequency
 
     Returns:
         The next due datetime, adjusted to the correct notification time
     """
+    last_day = localize(last_done).date()
+
     if frequency == FrequencyType.DAILY:
-        next_date = last_done + timedelta(days=1)
+        next_day = last_day + timedelta(days=1)
     elif frequency == FrequencyType.WEEKLY:
-        next_date = last_done + timedelta(weeks=1)
+        next_day = last_day + timedelta(weeks=1)
     elif frequency == FrequencyType.MONTHLY:
-        # Add months by calculating year and month
-        year = last_done.year
-        month = last_done.month + 1
-        if month > 12:
-            month = 1
-            year += 1
-        # Handle day overflow (e.g., Jan 31 + 1 month)
-        try:
-            next_date = last_done.replace(year=year, month=month)
-        except ValueError:
-            # If the day doesn't exist in the target month, use last day of month
-            next_date = last_done.replace(year=year, month=month, day=1) - timedelta(days=1)
+        # Jan 31 + 1 month -> last day of February
+        next_day = add_months(last_day, 1)
     elif frequency == FrequencyType.QUARTERLY:
-        # Add 3 months
-        year = last_done.year
-        month = last_done.month + 3
-        if month > 12:
-            month -= 12
-            year += 1
-        try:
-            next_date = last_done.replace(year=year, month=month)
-        except ValueError:
-            next_date = last_done.replace(year=year, month=month, day=1) - timedelta(days=1)
+        next_day = add_months(last_day, 3)
     elif frequency == FrequencyType.YEARLY:
-        next_date = last_done.replace(year=last_done.year + 1)
+        # Feb 29 + 1 year -> Feb 28
+        next_day = add_months(last_day, 12)
+    elif frequency == FrequencyType.CUSTOM:
+        if not rrule:
+            raise ValueError("Custom frequency requires a recurrence rule")
+        next_day = next_occurrence(rrule, last_day)
     else:
         raise ValueError(f"Unknown frequency: {frequency}")
 
     # Adjust time of day based on weekday/weekend
-    notification_time = get_notification_time(next_date)
-    return notification_time
+    return get_notification_instant(next_day)
+
 
+# Calendar step for each frequency: (days, months)
+_FREQUENCY_STEPS = {
+    FrequencyType.DAILY: (1, 0),
+    FrequencyType.WEEKLY: (7, 0),
+    FrequencyType.MONTHLY: (0, 1),
+    FrequencyType.QUARTERLY: (0, 3),
+    FrequencyType.YEARLY: (0, 12),
+}
 
-def should_notify_now(task: Task) -> bool:
+
+def compute_next_due_bulk(
+    frequencies: Sequence[FrequencyType],
+    last_done: Sequence[Union[datetime, float]],
+    rrules: Optional[Sequence[Optional[str]]] = None,
+) -> List[datetime]:
     """
-    Check if we should send a notification for this task right now.
+    Compute next due dates for many tasks in one pass.
+
+    Gives the same results as calling compute_next_due() per task, but works
+    on day ordinals and memoizes the month arithmetic and the notification
+    instant per calendar day. A household rarely spans more than a few
+    thousand distinct days, so recomputing e.g. 100k tasks after a timezone
+    change mostly hits those tables.
+
+    Args:
+        frequencies: Task frequencies
+        last_done: When each task was last completed, as datetimes or POSIX
+            timestamps
+        rrules: Recurrence rules per task (only read for 'custom' frequency)
 
     Returns:
-        True if next_due <= now and it's the correct notification time, False otherwise
+        The next due datetimes, in input order
     """
-    now = get_current_time()
+    if len(frequencies) != len(last_done):
+        raise ValueError("frequencies and last_done must have the same length")
+    if rrules is None:
+        rrules = [None] * len(frequencies)
 
-    # Task is due if next_due is in the past or now
-    is_due = task.next_due <= now
+    tz = TZ
+    steps = [_FREQUENCY_STEPS.get(FrequencyType(f)) for f in frequencies]
+    # Calendar tables: (day, months) -> day, and day -> notification instant
+    month_table: Dict[Tuple[int, int], int] = {}
+    instant_table: Dict[int, datetime] = {}
+    results = []
 
-    if not is_due:
-        return False
+    for step, done, rule in zip(steps, last_done, rrules):
+        if isinstance(done, datetime):
+            day = localize(done).toordinal()
+        else:
+            day = datetime.fromtimestamp(done, tz).toordinal()
 
-    # Check if it's approximately the correct notification time
-    # Allow a 5-minute window to avoid sending multiple notifications
-    notification_hour = WEEKDAY_NOTIFICATION_HOUR if is_weekday(now) else WEEKEND_NOTIFICATION_HOUR
-    current_hour = now.hour
-    current_minute = now.minute
+        if step is None:
+            if not rule:
+                raise ValueError("Custom frequency requires a recurrence rule")
+            next_day = next_occurrence(rule, date.fromordinal(day)).toordinal()
+        elif step[1]:
+            months = step[1]
+            key = (day, months)
+            next_day = month_table.get(key)
+            if next_day is None:
+                next_day = month_table[key] = add_months(date.fromordinal(day), months).toordinal()
+        else:
+            next_day = day + step[0]
 
-    # We notify if we're within the notification hour and first few minutes
-    is_notification_time = (current_hour == notification_hour and current_minute < 5)
+        instant = instant_table.get(next_day)
+        if instant is None:
+            instant = instant_table[next_day] = get_notification_instant(date.fromordinal(next_day))
+        results.append(instant)
 
-    return is_notification_time
+    return results
 
 
-def get_tasks_due_for_notification() -> list:
+class DueQueue:
     """
-    Get list of task IDs that should receive notifications now.
-    (To be called by the scheduler loop)
+    Min-heap of task notification instants (kept in UTC).
+
+    The scheduler sleeps until the earliest instant and is woken early when a
+    task is scheduled or removed. Updates push a new heap entry and leave the
+    old one behind; stale entries are skipped when they reach the top.
     """
-    # This will be implemented in the scheduler loop in main.py
-    # It will query the storage and return tasks that need notifications
-    pass
+
+    def __init__(self):
+        """Initialize an empty queue."""
+        self._heap: List[Tuple[datetime, str]] = []
+        self._instants: Dict[str, datetime] = {}
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._instants)
+
+    def schedule(self, task_id: str, instant: datetime) -> None:
+        """Schedule (or reschedule) a task's next notification."""
+        instant = to_utc(instant)
+        if self._instants.get(task_id) == instant:
+            return
+        self._instants[task_id] = instant
+        heapq.heappush(self._heap, (instant, task_id))
+        self._compact()
+        self._changed.set()
+
+    def remove(self, task_id: str) -> None:
+        """Stop scheduling notifications for a task."""
+        if self._instants.pop(task_id, None) is not None:
+            self._changed.set()
+
+    def peek(self) -> Optional[Tuple[datetime, str]]:
+        """Return the earliest (instant, task_id) without removing it."""
+        while self._heap:
+            instant, task_id = self._heap[0]
+            if self._instants.get(task_id) == instant:
+                return instant, task_id
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> List[Tuple[datetime, str]]:
+        """Remove and return all (instant, task_id) entries due at or before now (UTC instants)."""
+        now = to_utc(now)
+        due = []
+        while True:
+            entry = self.peek()
+            if entry is None or entry[0] > now:
+                break
+            heapq.heappop(self._heap)
+            del self._instants[entry[1]]
+            due.append(entry)
+        return due
+
+    async def wait(self, now: datetime) -> None:
+        """Sleep until the earliest instant or until the queue changes."""
+        entry = self.peek()
+        timeout = MAX_SCHEDULER_SLEEP
+        if entry is not None:
+            timeout = min(max((entry[0] - to_utc(now)).total_seconds(), 0.0), MAX_SCHEDULER_SLEEP)
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    def _compact(self) -> None:
+        """Drop stale entries once they outnumber the live ones."""
+        if len(self._heap) > 2 * len(self._instants) + 64:
+            self._heap = [(instant, task_id) for task_id, instant in self._instants.items()]
+            heapq.heapify(self._heap)
@@ -1,151 +1,1256 @@
 """
 Storage layer for tasks and devices using JSON files.
+
+Tasks and devices are loaded once at startup into in-memory maps keyed by id.
+Reads are served from memory; every mutation updates the map and is written
+through to the JSON files, or appended to a journal with the journal backend.
+
+SQLiteStorage is an alternative backend with the same public methods, backed
+by the standard library sqlite3 module and an index on next_due.
+
+Files are replaced atomically (temp file + fsync + rename), so a power cut
+never leaves a truncated file behind. With a commit delay configured,
+mutations arriving within that window share a single flush; pending_commit()
+hands out a future that the flush resolves, so writers can wait until their
+change is on disk before acknowledging it.
 """
+import base64
+import bisect
 import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from app.metrics import STORAGE_BYTES_READ, STORAGE_BYTES_WRITTEN, timed_storage
+from app.models import Device, FrequencyType, Task
+
+logger = logging.getLogger(__name__)
+
+# Journal size (bytes) after which JournalStorage folds it into a snapshot
+DEFAULT_COMPACT_THRESHOLD = 256 * 1024
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Flush a directory entry so a rename survives a power cut."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Not supported on every platform (e.g. Windows)
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(filepath: Path, data: dict) -> None:
+    """Write a JSON file via a temp file, fsync and rename."""
+    tmp = filepath.with_name(filepath.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+        STORAGE_BYTES_WRITTEN.labels(filepath.name).inc(f.tell())
+    os.replace(tmp, filepath)
+    _fsync_dir(filepath.parent)
+
+
+# Number of deleted task ids remembered for GET /tasks/changes
+MAX_TOMBSTONES = 10000
+
+
+class ChangeLog:
+    """
+    Revision bookkeeping for conditional requests and delta sync.
+
+    Every mutation bumps a store-wide revision. The revision at which each
+    task and device last changed is kept in memory, along with tombstones for
+    deleted tasks. devices_revision is the revision of the last device
+    change, so task changes don't invalidate the device list. Only the revision itself is persisted, so after a restart
+    (or once old tombstones have been dropped) a client that is further
+    behind gets a full reset instead of a delta.
+    """
+
+    def __init__(self, revision: int = 0):
+        """Start the log at a revision loaded from disk."""
+        self.revision = revision
+        self.base_revision = revision
+        self.devices_revision = revision
+        self._horizon = revision
+        self._tasks: Dict[str, int] = {}
+        self._devices: Dict[str, int] = {}
+        self._tombstones: "OrderedDict[str, int]" = OrderedDict()
+
+    def _bump(self) -> int:
+        self.revision += 1
+        return self.revision
+
+    # Called by the storage backends, with their lock held, for each mutation
+
+    def task_changed(self, task_id: str) -> None:
+        self._tasks[task_id] = self._bump()
+        self._tombstones.pop(task_id, None)
+
+    def task_deleted(self, task_id: str) -> None:
+        self._tasks.pop(task_id, None)
+        self._tombstones[task_id] = self._bump()
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            _, revision = self._tombstones.popitem(last=False)
+            self._horizon = max(self._horizon, revision)
+
+    def device_changed(self, device_id: str) -> None:
+        self._devices[device_id] = self.devices_revision = self._bump()
+
+    def device_deleted(self, device_id: str) -> None:
+        self._devices.pop(device_id, None)
+        self.devices_revision = self._bump()
+
+    def device_revision(self, device_id: str) -> int:
+        """Revision at which a device last changed."""
+        return self._devices.get(device_id, self.base_revision)
 
-from app.models import Device, Task
+    def changes_since(self, since: int) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        Get the tasks changed and deleted after a revision.
+
+        Returns:
+            (changed task ids, deleted task ids), or None if the client must
+            reload everything: it has nothing yet (since 0) or the log
+            cannot answer for that revision
+        """
+        if since == 0 or since < self._horizon or since > self.revision:
+            return None
+        if since == self.revision:
+            return [], []
+        changed = [task_id for task_id, revision in self._tasks.items() if revision > since]
+        deleted = [task_id for task_id, revision in self._tombstones.items() if revision > since]
+        return changed, deleted
+
+
+class VersionConflict(Exception):
+    """A conditional save or delete found the task at another version."""
+
+    def __init__(self, task_id: str, expected: int, actual: int):
+        super().__init__(f"Task {task_id} is at version {actual}, expected {expected}")
+        self.task_id = task_id
+        self.expected = expected
+        self.actual = actual
+
+
+def check_version(task_id: str, actual: int, expected: Optional[int]) -> None:
+    """
+    Compare-and-swap guard shared by the backends.
+
+    Args:
+        task_id: The task being written
+        actual: Stored version (0 when the task doesn't exist)
+        expected: Version the caller read, or None to write unconditionally
+
+    Raises:
+        VersionConflict: The stored version is not the expected one
+    """
+    if expected is not None and actual != expected:
+        raise VersionConflict(task_id, expected, actual)
+
+
+def _finish_commit(pending: Optional[Future], commit) -> None:
+    """Run a group commit and resolve the future its writers wait on."""
+    try:
+        commit()
+    except BaseException as e:
+        if pending is not None:
+            pending.set_exception(e)
+        raise
+    if pending is not None:
+        pending.set_result(None)
+
+
+def copy_task(task: Task) -> Task:
+    """
+    Copy a task so the caller can change it without touching the stored one.
+
+    Only assigned_to is mutable in place; the other fields are replaced, never
+    mutated, so a shallow copy with a fresh list is enough and much cheaper
+    than a deep copy.
+    """
+    return task.model_copy(update={"assigned_to": list(task.assigned_to)})
+
+
+def encode_cursor(task: Task) -> str:
+    """Build an opaque pagination cursor pointing just past a task."""
+    raw = json.dumps([task.next_due.timestamp(), task.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """
+    Decode a pagination cursor into its (next_due timestamp, task id) key.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, task_id = json.loads(raw)
+        return float(timestamp), str(task_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
 class Storage:
     """Handle persistent storage of tasks and devices using JSON files."""
 
-    def __init__(self, data_dir: str = "/data"):
-        """Initialize storage with a data directory."""
+    def __init__(self, data_dir: str = "/data", commit_delay: float = 0.0):
+        """
+        Initialize storage with a data directory.
+
+        Args:
+            data_dir: Directory for the data files
+            commit_delay: Seconds to collect mutations before flushing them
+                together (group commit). 0 flushes every mutation immediately.
+        """
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.tasks_file = self.data_dir / "tasks.json"
         self.devices_file = self.data_dir / "devices.json"
 
+        # Group commit state; the lock also guards the maps against the
+        # flush timer thread
+        self.commit_delay = commit_delay
+        self._lock = threading.RLock()
+        self._dirty: Set[str] = set()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._pending_commit: Optional[Future] = None
+
+        # Targets touched inside transaction(), committed when it ends
+        self._batch_depth = 0
+        self._batch: Set[str] = set()
+
+        # Revision bookkeeping; replaced once the stored revision is known
+        self.changes = ChangeLog()
+        self._loaded_revision = 0
+
         # Initialize files if they don't exist
         if not self.tasks_file.exists():
             self._write_tasks([])
         if not self.devices_file.exists():
             self._write_devices([])
 
+        # In-memory state, keyed by id
+        self._tasks: Dict[str, Task] = {}
+        self._devices: Dict[str, Device] = {}
+        self._load()
+        self.changes = ChangeLog(self._loaded_revision)
+
+        # Query indexes: (next_due timestamp, id) in sorted order, and task
+        # ids per assigned device
+        self._due_index: List[Tuple[float, str]] = []
+        self._due_keys: Dict[str, Tuple[float, str]] = {}
+        self._assignee_index: Dict[str, Set[str]] = {}
+        for task in self._tasks.values():
+            self._index_task(task)
+
+    def _load(self) -> None:
+        """Load tasks and devices from disk into memory."""
+        self._tasks = {t["id"]: self._task_from_dict(t) for t in self._read_tasks()}
+        self._devices = {d["id"]: self._device_from_dict(d) for d in self._read_devices()}
+
     def _read_file(self, filepath: Path) -> dict:
         """Read JSON file safely."""
         try:
             with open(filepath, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+                data = json.load(f)
+                STORAGE_BYTES_READ.labels(filepath.name).inc(f.tell())
+                return data
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            # Keep the damaged file for manual recovery instead of letting the
+            # next write overwrite it
+            corrupt = filepath.with_name(filepath.name + ".corrupt")
+            os.replace(filepath, corrupt)
+            logger.error(f"Could not parse {filepath.name} ({e}); moved it to {corrupt.name}")
             return {}
 
     def _write_file(self, filepath: Path, data: dict) -> None:
-        """Write JSON file safely."""
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=2, default=str)
+        """Write JSON file atomically via a temp file and rename."""
+        write_json_atomic(filepath, data)
 
     def _read_tasks(self) -> list:
         """Read tasks from file."""
         data = self._read_file(self.tasks_file)
+        self._loaded_revision = max(self._loaded_revision, data.get("revision", 0))
         return data.get("tasks", [])
 
     def _write_tasks(self, tasks: list) -> None:
         """Write tasks to file."""
-        self._write_file(self.tasks_file, {"tasks": tasks})
+        self._write_file(self.tasks_file, {"tasks": tasks, "revision": self.changes.revision})
 
     def _read_devices(self) -> list:
         """Read devices from file."""
         data = self._read_file(self.devices_file)
+        self._loaded_revision = max(self._loaded_revision, data.get("revision", 0))
         return data.get("devices", [])
 
     def _write_devices(self, devices: list) -> None:
         """Write devices to file."""
-        self._write_file(self.devices_file, {"devices": devices})
+        self._write_file(self.devices_file, {"devices": devices, "revision": self.changes.revision})
+
+    @staticmethod
+    def _task_from_dict(data: dict) -> Task:
+        """Build a Task from its stored representation."""
+        return Task(
+            id=data["id"],
+            name=data["name"],
+            frequency=data["frequency"],
+            last_done=datetime.fromisoformat(data["last_done"]),
+            next_due=datetime.fromisoformat(data["next_due"]),
+            assigned_to=data.get("assigned_to", []),
+            notify_at=datetime.fromisoformat(data["notify_at"]) if data.get("notify_at") else None,
+            rrule=data.get("rrule"),
+            version=data.get("version", 0),
+        )
+
+    @staticmethod
+    def _task_to_dict(task: Task) -> dict:
+        """Convert a Task to its stored representation."""
+        return {
+            "id": task.id,
+            "name": task.name,
+            "frequency": task.frequency,
+            "last_done": task.last_done.isoformat(),
+            "next_due": task.next_due.isoformat(),
+            "assigned_to": task.assigned_to,
+            "notify_at": task.notify_at.isoformat() if task.notify_at else None,
+            "rrule": task.rrule,
+            "version": task.version,
+        }
+
+    @staticmethod
+    def _device_from_dict(data: dict) -> Device:
+        """Build a Device from its stored representation."""
+        return Device(id=data["id"], notify_service=data["notify_service"])
+
+    @staticmethod
+    def _device_to_dict(device: Device) -> dict:
+        """Convert a Device to its stored representation."""
+        return {"id": device.id, "notify_service": device.notify_service}
+
+    def _persist_tasks(self) -> None:
+        """Write the in-memory tasks through to disk."""
+        self._write_tasks([self._task_to_dict(t) for t in self._tasks.values()])
+
+    def _persist_devices(self) -> None:
+        """Write the in-memory devices through to disk."""
+        self._write_devices([self._device_to_dict(d) for d in self._devices.values()])
+
+    # Persistence hooks, called with the lock held after the in-memory maps
+    # have been updated. Backends override these to change how mutations
+    # reach the disk.
+
+    def _on_task_saved(self, task: Task) -> None:
+        self._commit("tasks")
+
+    def _on_task_deleted(self, task_id: str) -> None:
+        self._commit("tasks")
+
+    def _on_device_saved(self, device: Device) -> None:
+        self._commit("devices")
+
+    def _on_device_deleted(self, device_id: str) -> None:
+        self._commit("devices")
+
+    def _commit(self, target: str) -> None:
+        """Flush a target now, or queue it for the next group commit."""
+        if self._batch_depth:
+            self._batch.add(target)
+            return
+        if self.commit_delay <= 0:
+            self._flush_targets({target})
+            return
+        self._dirty.add(target)
+        if self._flush_timer is None:
+            self._pending_commit = Future()
+            self._flush_timer = threading.Timer(self.commit_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def pending_commit(self) -> Optional[Future]:
+        """
+        Future resolved once the changes waiting for the group commit are on
+        disk (None if nothing is waiting).
+        """
+        with self._lock:
+            return self._pending_commit
+
+    def _flush_targets(self, targets: Set[str]) -> None:
+        """Write the given targets to disk."""
+        if "tasks" in targets:
+            self._persist_tasks()
+        if "devices" in targets:
+            self._persist_devices()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group several mutations into a single commit.
+
+        Other writers are held off until the block ends; the changes are
+        then committed once, as if they were a single mutation.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    targets, self._batch = self._batch, set()
+                    for target in sorted(targets):
+                        self._commit(target)
+
+    @timed_storage("flush")
+    def flush(self) -> None:
+        """Write all pending group-commit changes to disk."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            targets, self._dirty = self._dirty, set()
+            pending, self._pending_commit = self._pending_commit, None
+            if targets or pending is not None:
+                _finish_commit(pending, lambda: self._flush_targets(targets))
+
+    def _index_task(self, task: Task) -> None:
+        """Add a task to the query indexes."""
+        key = (task.next_due.timestamp(), task.id)
+        bisect.insort(self._due_index, key)
+        self._due_keys[task.id] = key
+        for device_id in task.assigned_to:
+            self._assignee_index.setdefault(device_id, set()).add(task.id)
+
+    def _unindex_task(self, task: Task) -> None:
+        """Remove a task from the query indexes."""
+        key = self._due_keys.pop(task.id, None)
+        if key is not None:
+            i = bisect.bisect_left(self._due_index, key)
+            if i < len(self._due_index) and self._due_index[i] == key:
+                del self._due_index[i]
+        for device_id in task.assigned_to:
+            task_ids = self._assignee_index.get(device_id)
+            if task_ids is not None:
+                task_ids.discard(task.id)
+                if not task_ids:
+                    del self._assignee_index[device_id]
+
+    @timed_storage("query_tasks")
+    def query_tasks(
+        self,
+        assigned_to: Optional[str] = None,
+        frequency: Optional[FrequencyType] = None,
+        due_after: Optional[datetime] = None,
+        due_before: Optional[datetime] = None,
+        after: Optional[Tuple[float, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        """
+        Get tasks ordered by next_due (then id), served from the indexes.
 
+        Args:
+            assigned_to: Only tasks assigned to this device
+            frequency: Only tasks with this frequency
+            due_after: Only tasks with next_due >= this
+            due_before: Only tasks with next_due < this
+            after: Cursor key from decode_cursor(); start just past it
+            limit: Maximum number of tasks to return
+
+        Returns:
+            Matching tasks
+        """
+        with self._lock:
+            if assigned_to is not None:
+                keys = sorted(self._due_keys[t] for t in self._assignee_index.get(assigned_to, ()))
+            else:
+                keys = self._due_index
+
+            start = 0
+            if due_after is not None:
+                start = bisect.bisect_left(keys, (due_after.timestamp(), ""))
+            if after is not None:
+                start = max(start, bisect.bisect_right(keys, after))
+            end_ts = due_before.timestamp() if due_before is not None else None
+
+            tasks = []
+            for i in range(start, len(keys)):
+                if limit is not None and len(tasks) >= limit:
+                    break
+                timestamp, task_id = keys[i]
+                if end_ts is not None and timestamp >= end_ts:
+                    break
+                task = self._tasks[task_id]
+                if frequency is not None and task.frequency != frequency:
+                    continue
+                tasks.append(copy_task(task))
+        return tasks
+
+    @timed_storage("get_tasks")
     def get_tasks(self) -> List[Task]:
         """Get all tasks."""
-        tasks_data = self._read_tasks()
+        # Hand out copies so callers can mutate them before save_task()
+        return [copy_task(t) for t in self._tasks.values()]
+
+    @timed_storage("get_task")
+    def get_task(self, task_id: str) -> Optional[Task]:
+        """Get a specific task by ID."""
+        task = self._tasks.get(task_id)
+        return copy_task(task) if task else None
+
+    @timed_storage("get_task_changes")
+    def get_task_changes(self, since: int) -> Tuple[int, bool, List[Task], List[str]]:
+        """
+        Get what changed in the task list after a revision.
+
+        Returns:
+            (current revision, reset, changed tasks, deleted task ids). With
+            reset set, the changed tasks are all tasks and the client should
+            replace its copy.
+        """
+        with self._lock:
+            revision = self.changes.revision
+            delta = self.changes.changes_since(since)
+            if delta is None:
+                return revision, True, self.get_tasks(), []
+            changed, deleted = delta
+            return revision, False, [copy_task(self._tasks[t]) for t in changed], deleted
+
+    @timed_storage("save_task")
+    def save_task(self, task: Task, expected_version: Optional[int] = None) -> int:
+        """
+        Save a task (create or update) and bump its version.
+
+        Args:
+            task: The task; its version is updated in place
+            expected_version: Only save if the stored task is still at this
+                version (0: only if it doesn't exist yet)
+
+        Returns:
+            The storage revision of this change
+
+        Raises:
+            VersionConflict: The stored task is at another version
+        """
+        with self._lock:
+            previous = self._tasks.get(task.id)
+            current = previous.version if previous is not None else 0
+            check_version(task.id, current, expected_version)
+            task.version = current + 1
+            if previous is not None:
+                self._unindex_task(previous)
+            self._tasks[task.id] = copy_task(task)
+            self._index_task(task)
+            self.changes.task_changed(task.id)
+            self._on_task_saved(task)
+            return self.changes.revision
+
+    @timed_storage("delete_task")
+    def delete_task(self, task_id: str, expected_version: Optional[int] = None) -> int:
+        """
+        Delete a task by ID.
+
+        Returns:
+            The storage revision of this change (the current revision if the
+            task didn't exist)
+
+        Raises:
+            VersionConflict: expected_version is set and the stored task is
+                at another version
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            check_version(task_id, task.version if task is not None else 0, expected_version)
+            if task is not None:
+                del self._tasks[task_id]
+                self._unindex_task(task)
+                self.changes.task_deleted(task_id)
+                self._on_task_deleted(task_id)
+            return self.changes.revision
+
+    @timed_storage("get_devices")
+    def get_devices(self) -> List[Device]:
+        """Get all devices."""
+        return [d.model_copy() for d in self._devices.values()]
+
+    def count_tasks(self) -> int:
+        """Get the number of tasks."""
+        return len(self._tasks)
+
+    def count_devices(self) -> int:
+        """Get the number of devices."""
+        return len(self._devices)
+
+    @timed_storage("get_device")
+    def get_device(self, device_id: str) -> Optional[Device]:
+        """Get a specific device by ID."""
+        device = self._devices.get(device_id)
+        return device.model_copy() if device else None
+
+    @timed_storage("get_devices_by_id")
+    def get_devices_by_id(self, device_ids: Iterable[str]) -> Dict[str, Device]:
+        """Get the given devices, keyed by id; unknown ids are left out."""
+        return {
+            device_id: self._devices[device_id].model_copy()
+            for device_id in set(device_ids)
+            if device_id in self._devices
+        }
+
+    def get_device_task_ids(self, device_id: str) -> List[str]:
+        """IDs of the tasks assigned to a device."""
+        return sorted(self._assignee_index.get(device_id, ()))
+
+    def get_dangling_assignments(self) -> Dict[str, List[str]]:
+        """Task IDs per assigned device id that has no device."""
+        with self._lock:
+            return {
+                device_id: sorted(task_ids)
+                for device_id, task_ids in self._assignee_index.items()
+                if device_id not in self._devices
+            }
+
+    @timed_storage("save_device")
+    def save_device(self, device: Device) -> None:
+        """Save a device (create or update)."""
+        with self._lock:
+            self._devices[device.id] = device.model_copy()
+            self.changes.device_changed(device.id)
+            self._on_device_saved(device)
+
+    @timed_storage("delete_device")
+    def delete_device(self, device_id: str) -> List[Tuple[Task, int]]:
+        """
+        Delete a device by ID and unassign it from its tasks.
+
+        The device and the task changes are committed together; each
+        unassigned task gets a new version.
+
+        Returns:
+            The tasks the device was removed from, each with the storage
+            revision of its change
+        """
+        unassigned = []
+        with self.transaction():
+            for task_id in self.get_device_task_ids(device_id):
+                task = copy_task(self._tasks[task_id])
+                task.assigned_to = [d for d in task.assigned_to if d != device_id]
+                unassigned.append((task, self.save_task(task)))
+            if self._devices.pop(device_id, None) is not None:
+                self.changes.device_deleted(device_id)
+                self._on_device_deleted(device_id)
+        return unassigned
+
+    def close(self) -> None:
+        """Flush pending changes and release any resources."""
+        self.flush()
+
+
+class JournalStorage(Storage):
+    """
+    Storage that appends every mutation to a journal instead of rewriting files.
+
+    tasks.json and devices.json act as the snapshot. On startup the snapshot is
+    loaded and the journal is replayed on top of it. Once the journal grows
+    past the compaction threshold it is rotated and folded into a new snapshot
+    in a background thread.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "/data",
+        commit_delay: float = 0.0,
+        compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+    ):
+        """Initialize journal storage with a data directory."""
+        self.journal_file = Path(data_dir) / "journal.jsonl"
+        self.compacting_file = Path(data_dir) / "journal.jsonl.compacting"
+        self.compact_threshold = compact_threshold
+        self._compactor: Optional[threading.Thread] = None
+        super().__init__(data_dir, commit_delay=commit_delay)
+
+        # Fold whatever was replayed into the snapshot so we start clean
+        if self.compacting_file.exists() or self._journal_size() > 0:
+            self._write_snapshot(dict(self._tasks), dict(self._devices))
+            self.compacting_file.unlink(missing_ok=True)
+            self.journal_file.unlink(missing_ok=True)
+        self._journal = open(self.journal_file, "a")
+
+    def _load(self) -> None:
+        """Load the snapshot, then replay journal entries on top of it."""
+        super()._load()
+        # A leftover .compacting file means compaction was interrupted; its
+        # entries are older than the ones in the live journal.
+        for path in (self.compacting_file, self.journal_file):
+            if path.exists():
+                self._replay(path)
+
+    def _replay(self, path: Path) -> None:
+        """Apply journal entries from a file to the in-memory maps."""
+        with open(path, "r") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Typically a torn last line after a crash
+                    logger.warning(f"Skipping corrupt journal entry {path.name}:{line_no}")
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry: dict) -> None:
+        """Apply a single journal entry to the in-memory maps."""
+        op, kind = entry.get("op"), entry.get("kind")
+        self._loaded_revision = max(self._loaded_revision, entry.get("rev", 0))
+        if kind == "task":
+            if op == "save":
+                task = self._task_from_dict(entry["data"])
+                self._tasks[task.id] = task
+            elif op == "delete":
+                self._tasks.pop(entry["id"], None)
+        elif kind == "device":
+            if op == "save":
+                device = self._device_from_dict(entry["data"])
+                self._devices[device.id] = device
+            elif op == "delete":
+                self._devices.pop(entry["id"], None)
+
+    def _journal_size(self) -> int:
+        """Current size of the live journal in bytes."""
+        try:
+            return self.journal_file.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _append(self, entry: dict) -> None:
+        """Append an entry to the journal and compact if it grew too large."""
+        entry["rev"] = self.changes.revision
+        line = json.dumps(entry, default=str) + "\n"
+        self._journal.write(line)
+        STORAGE_BYTES_WRITTEN.labels(self.journal_file.name).inc(len(line))
+        self._journal.flush()
+        self._commit("journal")
+        if self._journal.tell() >= self.compact_threshold:
+            self._start_compaction()
+
+    def _flush_targets(self, targets: Set[str]) -> None:
+        """Fsync the journal; the snapshot files are only written by compaction."""
+        if "journal" in targets:
+            os.fsync(self._journal.fileno())
+
+    def _on_task_saved(self, task: Task) -> None:
+        self._append({"op": "save", "kind": "task", "data": self._task_to_dict(task)})
+
+    def _on_task_deleted(self, task_id: str) -> None:
+        self._append({"op": "delete", "kind": "task", "id": task_id})
+
+    def _on_device_saved(self, device: Device) -> None:
+        self._append({"op": "save", "kind": "device", "data": self._device_to_dict(device)})
+
+    def _on_device_deleted(self, device_id: str) -> None:
+        self._append({"op": "delete", "kind": "device", "id": device_id})
+
+    def _start_compaction(self) -> None:
+        """Rotate the journal and write a snapshot in a background thread."""
+        if self._compactor and self._compactor.is_alive():
+            return
+
+        # Stored models are replaced, never mutated, so shallow copies of the
+        # maps are a consistent view of the state covered by the old journal.
+        tasks, devices = dict(self._tasks), dict(self._devices)
+
+        # If a previous compaction failed its rotated journal is still around;
+        # keep it and only retry the snapshot, which covers it as well.
+        if not self.compacting_file.exists():
+            # Fsync the journal itself: inside transaction() its pending
+            # commit is in _batch, not _dirty, so flush() would skip it
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            os.replace(self.journal_file, self.compacting_file)
+            self._journal = open(self.journal_file, "a")
+
+        self._compactor = threading.Thread(
+            target=self._compact,
+            args=(tasks, devices),
+            name="storage-compactor",
+            daemon=True,
+        )
+        self._compactor.start()
+
+    def _compact(self, tasks: Dict[str, Task], devices: Dict[str, Device]) -> None:
+        """Write the snapshot and drop the rotated journal."""
+        try:
+            self._write_snapshot(tasks, devices)
+            self.compacting_file.unlink(missing_ok=True)
+            logger.info(f"Compacted journal into snapshot ({len(tasks)} tasks, {len(devices)} devices)")
+        except Exception as e:
+            # The rotated journal is kept and replayed on the next startup
+            logger.error(f"Journal compaction failed: {e}", exc_info=True)
+
+    def _write_snapshot(self, tasks: Dict[str, Task], devices: Dict[str, Device]) -> None:
+        """Write the given state as the snapshot files."""
+        self._write_tasks([self._task_to_dict(t) for t in tasks.values()])
+        self._write_devices([self._device_to_dict(d) for d in devices.values()])
+
+    def close(self) -> None:
+        """Flush the journal, wait for a running compaction and close it."""
+        self.flush()
+        if self._compactor:
+            self._compactor.join()
+        self._journal.close()
+
+
+class SQLiteStorage:
+    """
+    Handle persistent storage of tasks and devices in a SQLite database.
+
+    Exposes the same public methods as Storage. Tasks are indexed on
+    (next_due, id), which serves the filtered and paginated task queries,
+    and the assigned_to list is kept in its own relation table. On first boot existing tasks.json and
+    devices.json files are migrated into the database (and left in place).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            frequency TEXT NOT NULL,
+            last_done TEXT NOT NULL,
+            next_due TEXT NOT NULL,
+            next_due_ts REAL NOT NULL,
+            notify_at TEXT,
+            rrule TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_next_due_id ON tasks (next_due_ts, id);
+
+        CREATE TABLE IF NOT EXISTS devices (
+            id TEXT PRIMARY KEY,
+            notify_service TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS task_assignees (
+            task_id TEXT NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+            device_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (task_id, device_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_task_assignees_device ON task_assignees (device_id);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, data_dir: str = "/data", commit_delay: float = 0.0):
+        """
+        Initialize SQLite storage with a data directory.
+
+        Args:
+            data_dir: Directory for the database file
+            commit_delay: Seconds to collect mutations before committing them
+                together (group commit). 0 commits every mutation immediately.
+        """
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = self.data_dir / "chores.db"
+        self.commit_delay = commit_delay
+        self._lock = threading.RLock()
+        self._commit_timer: Optional[threading.Timer] = None
+        self._pending_commit: Optional[Future] = None
+        self._batch_depth = 0
+
+        first_boot = not self.db_file.exists()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self.SCHEMA)
+        self._upgrade_schema()
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        self.changes = ChangeLog(row[0] if row else 0)
+
+        if first_boot:
+            self._migrate_json()
+
+    def _upgrade_schema(self) -> None:
+        """Add columns introduced after a database was created."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        for column in ("notify_at", "rrule"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Superseded by idx_tasks_next_due_id, which also covers pagination order
+        self._conn.execute("DROP INDEX IF EXISTS idx_tasks_next_due")
+
+    def _migrate_json(self) -> None:
+        """Import tasks.json and devices.json from the JSON backend, if present."""
+        tasks_file = self.data_dir / "tasks.json"
+        devices_file = self.data_dir / "devices.json"
+        tasks, devices = [], []
+        for path, key, target in ((tasks_file, "tasks", tasks), (devices_file, "devices", devices)):
+            if not path.exists():
+                continue
+            try:
+                with open(path, "r") as f:
+                    target.extend(json.load(f).get(key, []))
+            except json.JSONDecodeError as e:
+                logger.error(f"Could not migrate {path.name}: {e}")
+
+        if not tasks and not devices:
+            return
+
+        with self._lock:
+            for data in devices:
+                self._insert_device(Storage._device_from_dict(data))
+            for data in tasks:
+                self._insert_task(Storage._task_from_dict(data))
+            self._conn.commit()
+        logger.info(f"Migrated {len(tasks)} tasks and {len(devices)} devices from JSON into {self.db_file.name}")
+
+    def _commit(self) -> None:
+        """Commit now, or schedule a group commit."""
+        if self._batch_depth:
+            return
+        if self.commit_delay <= 0:
+            self._conn.commit()
+            return
+        if self._commit_timer is None:
+            self._pending_commit = Future()
+            self._commit_timer = threading.Timer(self.commit_delay, self.flush)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+
+    def pending_commit(self) -> Optional[Future]:
+        """Future resolved by the next group commit; see Storage.pending_commit."""
+        with self._lock:
+            return self._pending_commit
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group several mutations into a single database commit."""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._commit()
+
+    @timed_storage("flush")
+    def flush(self) -> None:
+        """Commit any pending group-commit changes."""
+        with self._lock:
+            if self._commit_timer is not None:
+                self._commit_timer.cancel()
+                self._commit_timer = None
+            pending, self._pending_commit = self._pending_commit, None
+            _finish_commit(pending, self._conn.commit)
+
+    def close(self) -> None:
+        """Commit pending changes and close the database."""
+        self.flush()
+        self._conn.close()
+
+    def _store_revision(self) -> None:
+        """Record the current revision in the pending transaction."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (self.changes.revision,)
+        )
+
+    def _insert_task(self, task: Task) -> None:
+        """Insert or update a task row and its assignees."""
+        # An upsert keeps the row (and its rowid, the creation order that
+        # get_tasks returns) instead of re-inserting it at the end
+        self._conn.execute(
+            "INSERT INTO tasks"
+            " (id, name, frequency, last_done, next_due, next_due_ts, notify_at, rrule, version)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET"
+            " name = excluded.name, frequency = excluded.frequency, last_done = excluded.last_done,"
+            " next_due = excluded.next_due, next_due_ts = excluded.next_due_ts,"
+            " notify_at = excluded.notify_at, rrule = excluded.rrule, version = excluded.version",
+            (
+                task.id,
+                task.name,
+                task.frequency.value,
+                task.last_done.isoformat(),
+                task.next_due.isoformat(),
+                task.next_due.timestamp(),
+                task.notify_at.isoformat() if task.notify_at else None,
+                task.rrule,
+                task.version,
+            ),
+        )
+        self._conn.execute("DELETE FROM task_assignees WHERE task_id = ?", (task.id,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO task_assignees (task_id, device_id, position) VALUES (?, ?, ?)",
+            [(task.id, device_id, i) for i, device_id in enumerate(task.assigned_to)],
+        )
+
+    def _insert_device(self, device: Device) -> None:
+        """Insert or update a device row, keeping its position."""
+        self._conn.execute(
+            "INSERT INTO devices (id, notify_service) VALUES (?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET notify_service = excluded.notify_service",
+            (device.id, device.notify_service),
+        )
+
+    def _select_tasks(self, where: str = "", params: tuple = ()) -> List[Task]:
+        """Load tasks matching a WHERE clause, including their assignees."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, name, frequency, last_done, next_due, notify_at, rrule, version FROM tasks {where}",
+                params,
+            ).fetchall()
+            if not rows:
+                return []
+            ids = [r[0] for r in rows]
+            assignees: Dict[str, List[str]] = {task_id: [] for task_id in ids}
+            # Chunk to stay below SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for task_id, device_id in self._conn.execute(
+                    f"SELECT task_id, device_id FROM task_assignees WHERE task_id IN ({placeholders})"
+                    " ORDER BY task_id, position",
+                    chunk,
+                ):
+                    assignees[task_id].append(device_id)
+
         return [
             Task(
-                id=t["id"],
-                name=t["name"],
-                frequency=t["frequency"],
-                last_done=datetime.fromisoformat(t["last_done"]),
-                next_due=datetime.fromisoformat(t["next_due"]),
-                assigned_to=t.get("assigned_to", []),
+                id=task_id,
+                name=name,
+                frequency=frequency,
+                last_done=datetime.fromisoformat(last_done),
+                next_due=datetime.fromisoformat(next_due),
+                assigned_to=assignees[task_id],
+                notify_at=datetime.fromisoformat(notify_at) if notify_at else None,
+                rrule=rrule,
+                version=version,
             )
-            for t in tasks_data
+            for task_id, name, frequency, last_done, next_due, notify_at, rrule, version in rows
         ]
 
+    @timed_storage("get_tasks")
+    def get_tasks(self) -> List[Task]:
+        """Get all tasks."""
+        return self._select_tasks("ORDER BY rowid")
+
+    @timed_storage("get_task")
     def get_task(self, task_id: str) -> Optional[Task]:
         """Get a specific task by ID."""
-        tasks = self.get_tasks()
-        for task in tasks:
-            if task.id == task_id:
-                return task
-        return None
-
-    def save_task(self, task: Task) -> None:
-        """Save a task (create or update)."""
-        tasks = self.get_tasks()
-        # Remove existing task with same ID if it exists
-        tasks = [t for t in tasks if t.id != task.id]
-        # Add the new/updated task
-        tasks.append(task)
-        tasks_data = [
-            {
-                "id": t.id,
-                "name": t.name,
-                "frequency": t.frequency,
-                "last_done": t.last_done.isoformat(),
-                "next_due": t.next_due.isoformat(),
-                "assigned_to": t.assigned_to,
-            }
-            for t in tasks
-        ]
-        self._write_tasks(tasks_data)
-
-    def delete_task(self, task_id: str) -> None:
-        """Delete a task by ID."""
-        tasks = self.get_tasks()
-        tasks = [t for t in tasks if t.id != task_id]
-        tasks_data = [
-            {
-                "id": t.id,
-                "name": t.name,
-                "frequency": t.frequency,
-                "last_done": t.last_done.isoformat(),
-                "next_due": t.next_due.isoformat(),
-                "assigned_to": t.assigned_to,
-            }
-            for t in tasks
-        ]
-        self._write_tasks(tasks_data)
+        tasks = self._select_tasks("WHERE id = ?", (task_id,))
+        return tasks[0] if tasks else None
+
+    @timed_storage("query_tasks")
+    def query_tasks(
+        self,
+        assigned_to: Optional[str] = None,
+        frequency: Optional[FrequencyType] = None,
+        due_after: Optional[datetime] = None,
+        due_before: Optional[datetime] = None,
+        after: Optional[Tuple[float, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        """Get tasks ordered by next_due (then id); see Storage.query_tasks."""
+        clauses, params = [], []
+        if assigned_to is not None:
+            clauses.append("id IN (SELECT task_id FROM task_assignees WHERE device_id = ?)")
+            params.append(assigned_to)
+        if frequency is not None:
+            clauses.append("frequency = ?")
+            params.append(frequency.value)
+        if due_after is not None:
+            clauses.append("next_due_ts >= ?")
+            params.append(due_after.timestamp())
+        if due_before is not None:
+            clauses.append("next_due_ts < ?")
+            params.append(due_before.timestamp())
+        if after is not None:
+            clauses.append("(next_due_ts, id) > (?, ?)")
+            params.extend(after)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        where += "ORDER BY next_due_ts, id"
+        if limit is not None:
+            where += " LIMIT ?"
+            params.append(limit)
+        return self._select_tasks(where, tuple(params))
+
+    @timed_storage("get_task_changes")
+    def get_task_changes(self, since: int) -> Tuple[int, bool, List[Task], List[str]]:
+        """Get what changed in the task list after a revision; see Storage.get_task_changes."""
+        with self._lock:
+            revision = self.changes.revision
+            delta = self.changes.changes_since(since)
+            if delta is None:
+                return revision, True, self.get_tasks(), []
+            changed, deleted = delta
+            tasks = []
+            # Chunk to stay below SQLite's bound-parameter limit
+            for i in range(0, len(changed), 500):
+                chunk = changed[i:i + 500]
+                tasks.extend(self._select_tasks(f"WHERE id IN ({','.join('?' * len(chunk))})", tuple(chunk)))
+            return revision, False, tasks, deleted
+
+    def _task_version(self, task_id: str) -> int:
+        """Stored version of a task (0 if it doesn't exist)."""
+        row = self._conn.execute("SELECT version FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row[0] if row else 0
+
+    @timed_storage("save_task")
+    def save_task(self, task: Task, expected_version: Optional[int] = None) -> int:
+        """Save a task and bump its version; see Storage.save_task."""
+        with self._lock:
+            current = self._task_version(task.id)
+            check_version(task.id, current, expected_version)
+            task.version = current + 1
+            self._insert_task(task)
+            self.changes.task_changed(task.id)
+            self._store_revision()
+            self._commit()
+            return self.changes.revision
 
+    @timed_storage("delete_task")
+    def delete_task(self, task_id: str, expected_version: Optional[int] = None) -> int:
+        """Delete a task by ID; see Storage.delete_task."""
+        with self._lock:
+            check_version(task_id, self._task_version(task_id), expected_version)
+            if self._conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount:
+                self.changes.task_deleted(task_id)
+                self._store_revision()
+            self._commit()
+            return self.changes.revision
+
+    def count_tasks(self) -> int:
+        """Get the number of tasks."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def count_devices(self) -> int:
+        """Get the number of devices."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    @timed_storage("get_devices")
     def get_devices(self) -> List[Device]:
         """Get all devices."""
-        devices_data = self._read_devices()
-        return [Device(id=d["id"], notify_service=d["notify_service"]) for d in devices_data]
+        with self._lock:
+            rows = self._conn.execute("SELECT id, notify_service FROM devices ORDER BY rowid").fetchall()
+        return [Device(id=device_id, notify_service=notify_service) for device_id, notify_service in rows]
 
+    @timed_storage("get_device")
     def get_device(self, device_id: str) -> Optional[Device]:
         """Get a specific device by ID."""
-        devices = self.get_devices()
-        for device in devices:
-            if device.id == device_id:
-                return device
-        return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, notify_service FROM devices WHERE id = ?", (device_id,)
+            ).fetchone()
+        return Device(id=row[0], notify_service=row[1]) if row else None
+
+    @timed_storage("get_devices_by_id")
+    def get_devices_by_id(self, device_ids: Iterable[str]) -> Dict[str, Device]:
+        """Get the given devices, keyed by id; unknown ids are left out."""
+        ids = sorted(set(device_ids))
+        devices = {}
+        with self._lock:
+            # Chunk to stay below SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for device_id, notify_service in self._conn.execute(
+                    f"SELECT id, notify_service FROM devices WHERE id IN ({placeholders})", chunk
+                ):
+                    devices[device_id] = Device(id=device_id, notify_service=notify_service)
+        return devices
+
+    def get_device_task_ids(self, device_id: str) -> List[str]:
+        """IDs of the tasks assigned to a device."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id FROM task_assignees WHERE device_id = ? ORDER BY task_id", (device_id,)
+            ).fetchall()
+        return [task_id for (task_id,) in rows]
 
+    def get_dangling_assignments(self) -> Dict[str, List[str]]:
+        """Task IDs per assigned device id that has no device."""
+        dangling: Dict[str, List[str]] = {}
+        with self._lock:
+            for device_id, task_id in self._conn.execute(
+                "SELECT device_id, task_id FROM task_assignees"
+                " WHERE device_id NOT IN (SELECT id FROM devices) ORDER BY device_id, task_id"
+            ):
+                dangling.setdefault(device_id, []).append(task_id)
+        return dangling
+
+    @timed_storage("save_device")
     def save_device(self, device: Device) -> None:
         """Save a device (create or update)."""
-        devices = self.get_devices()
-        # Remove existing device with same ID if it exists
-        devices = [d for d in devices if d.id != device.id]
-        # Add the new/updated device
-        devices.append(device)
-        devices_data = [
-            {"id": d.id, "notify_service": d.notify_service} for d in devices
-        ]
-        self._write_devices(devices_data)
-
-    def delete_device(self, device_id: str) -> None:
-        """Delete a device by ID."""
-        devices = self.get_devices()
-        devices = [d for d in devices if d.id != device_id]
-        devices_data = [
-            {"id": d.id, "notify_service": d.notify_service} for d in devices
-        ]
-        self._write_devices(devices_data)
+        with self._lock:
+            self._insert_device(device)
+            self.changes.device_changed(device.id)
+            self._store_revision()
+            self._commit()
+
+    @timed_storage("delete_device")
+    def delete_device(self, device_id: str) -> List[Tuple[Task, int]]:
+        """Delete a device and unassign it from its tasks; see Storage.delete_device."""
+        unassigned = []
+        with self.transaction():
+            tasks = self._select_tasks(
+                "WHERE id IN (SELECT task_id FROM task_assignees WHERE device_id = ?) ORDER BY id", (device_id,)
+            )
+            for task in tasks:
+                task.assigned_to = [d for d in task.assigned_to if d != device_id]
+                unassigned.append((task, self.save_task(task)))
+            if self._conn.execute("DELETE FROM devices WHERE id = ?", (device_id,)).rowcount:
+                self.changes.device_deleted(device_id)
+                self._store_revision()
+        return unassigned
+
+
+STORAGE_BACKENDS = {
+    "json": Storage,
+    "journal": JournalStorage,
+    "sqlite": SQLiteStorage,
+}
+
+
+def create_storage(
+    backend: str = "json", data_dir: str = "/data", commit_delay: float = 0.0
+) -> Union[Storage, SQLiteStorage]:
+    """
+    Create a storage instance for the configured backend.
+
+    Args:
+        backend: Backend name ('json', 'journal' or 'sqlite')
+        data_dir: Directory for the data files
+        commit_delay: Group commit window in seconds (0 disables batching)
+
+    Returns:
+        A Storage instance
+    """
+    try:
+        storage_cls = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return storage_cls(data_dir=data_dir, commit_delay=commit_delay)
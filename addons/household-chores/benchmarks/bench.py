@@ -0,0 +1,449 @@
+"""
+Benchmarks for the storage, scheduler and API hot paths.
+
+Generates synthetic households of a given size, then measures:
+- Storage.get_tasks / save_task for each storage backend, and get_tasks
+  against re-parsing tasks.json on every read (the pre-cache behaviour)
+- compute_next_due (scalar and bulk)
+- one scheduler tick with a burst of due tasks
+- GET /tasks and POST /ha/action end to end through the FastAPI test client
+- request latency percentiles under concurrent load (reads, writes and
+  /health mixed, --rate), optionally on a simulated slow disk
+
+Home Assistant is replaced by a local HTTP server that accepts every notify
+call. Results are written as JSON so runs can be compared between versions.
+
+Usage (from addons/household-chores):
+    python benchmarks/bench.py --sizes 10,1000,100000 --output results.json
+    python benchmarks/bench.py --sizes 1000 --rate 100 --disk-latency 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models import Device, FrequencyType, Task  # noqa: E402
+from app.scheduler import compute_next_due, compute_next_due_bulk  # noqa: E402
+from app.storage import STORAGE_BACKENDS, Storage, create_storage  # noqa: E402
+
+FREQUENCIES = [
+    FrequencyType.DAILY,
+    FrequencyType.WEEKLY,
+    FrequencyType.MONTHLY,
+    FrequencyType.QUARTERLY,
+    FrequencyType.YEARLY,
+]
+
+
+# ============================================================================
+# Synthetic data
+# ============================================================================
+
+def generate_household(size: int, seed: int = 42) -> Tuple[List[Task], List[Device]]:
+    """
+    Build a household with `size` tasks and one device per 20 tasks.
+
+    Each task is assigned to 1-3 devices and falls due within the next 30 days.
+    """
+    rng = random.Random(seed)
+    devices = [
+        Device(id=f"phone_{i}", notify_service=f"notify.mobile_app_phone_{i}")
+        for i in range(max(1, size // 20))
+    ]
+    now = datetime.now(timezone.utc)
+    tasks = []
+    for i in range(size):
+        last_done = now - timedelta(days=rng.randint(0, 365))
+        tasks.append(Task(
+            id=f"t{i:06d}",
+            name=f"Chore {i}",
+            frequency=rng.choice(FREQUENCIES),
+            last_done=last_done,
+            next_due=now + timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+            assigned_to=[d.id for d in rng.sample(devices, min(len(devices), rng.randint(1, 3)))],
+        ))
+    return tasks, devices
+
+
+def populate(backend: str, data_dir: str, tasks: List[Task], devices: List[Device]) -> None:
+    """Write a household into a fresh data directory."""
+    storage = create_storage(backend=backend, data_dir=data_dir)
+    with storage.transaction():
+        for device in devices:
+            storage.save_device(device)
+        for task in tasks:
+            storage.save_task(task)
+    storage.close()
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def measure(name: str, fn: Callable[[], None], repeat: int, **labels) -> Dict:
+    """Run fn `repeat` times and summarize the timings (seconds)."""
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    result = {
+        "name": name,
+        **labels,
+        "repeat": repeat,
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min": timings[0],
+        "max": timings[-1],
+    }
+    print(
+        f"{name:<28} {' '.join(f'{k}={v}' for k, v in labels.items()):<32} "
+        f"median {result['median'] * 1000:9.3f} ms  p95 {result['p95'] * 1000:9.3f} ms"
+    )
+    return result
+
+
+class MockHomeAssistant(BaseHTTPRequestHandler):
+    """Accept every Home Assistant API call with a 200."""
+
+    protocol_version = "HTTP/1.1"
+    # Small keep-alive responses otherwise stall on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self) -> None:
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._reply()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply()
+
+
+def _serve_mock_ha(ports: multiprocessing.Queue) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHomeAssistant)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_mock_ha() -> Tuple[multiprocessing.Process, str]:
+    """
+    Start the mock Home Assistant on a free local port.
+
+    It runs in its own process so it doesn't compete with the app for the GIL.
+    """
+    ports: multiprocessing.Queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_mock_ha, args=(ports,), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ports.get(timeout=10)}"
+
+
+# ============================================================================
+# Benchmarks
+# ============================================================================
+
+def bench_storage(backend: str, size: int, tasks: List[Task], devices: List[Device], repeat: int) -> List[Dict]:
+    """Storage reads and writes on a populated store."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        populate(backend, data_dir, tasks, devices)
+        storage = create_storage(backend=backend, data_dir=data_dir)
+        rng = random.Random(1)
+
+        def save_task():
+            task = tasks[rng.randrange(len(tasks))].model_copy()
+            task.last_done = datetime.now(timezone.utc)
+            storage.save_task(task)
+
+        def reparse_tasks():
+            # What get_tasks did before tasks were kept in memory
+            storage.flush()
+            with open(storage.tasks_file) as f:
+                return [Storage._task_from_dict(t) for t in json.load(f)["tasks"]]
+
+        results = [
+            measure("storage.get_tasks", storage.get_tasks, repeat, backend=backend, size=size),
+            measure("storage.get_task", lambda: storage.get_task(tasks[rng.randrange(len(tasks))].id),
+                    repeat, backend=backend, size=size),
+            measure("storage.save_task", save_task, repeat, backend=backend, size=size),
+        ]
+        if backend == "json":
+            results.append(measure("tasks.json reparse", reparse_tasks, repeat, backend=backend, size=size))
+        storage.close()
+    return results
+
+
+def bench_compute_next_due(size: int, tasks: List[Task], repeat: int) -> List[Dict]:
+    """Next due date for every task, one by one and in bulk."""
+    frequencies = [t.frequency for t in tasks]
+    last_done = [t.last_done for t in tasks]
+    return [
+        measure("compute_next_due", lambda: [compute_next_due(f, d) for f, d in zip(frequencies, last_done)],
+                repeat, size=size),
+        measure("compute_next_due_bulk", lambda: compute_next_due_bulk(frequencies, last_done), repeat, size=size),
+    ]
+
+
+def bench_app(backend: str, size: int, tasks: List[Task], devices: List[Device], repeat: int, max_due: int) -> List[Dict]:
+    """Scheduler tick and API requests against a running app."""
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        populate(backend, data_dir, tasks, devices)
+        os.environ["DATA_DIR"] = data_dir
+        os.environ["STORAGE_BACKEND"] = backend
+
+        with TestClient(main.app) as client:
+            rng = random.Random(2)
+            due = [t.id for t in tasks[:max_due]]
+
+            # Drive the scheduler by hand, on the app's event loop
+            async def stop_scheduler():
+                main.scheduler_task.cancel()
+                try:
+                    await main.scheduler_task
+                except asyncio.CancelledError:
+                    pass
+
+            async def run_tick():
+                now = main.get_current_time()
+                for task_id in due:
+                    main.due_queue.schedule(task_id, now)
+                await main.scheduler_tick()
+
+            client.portal.call(stop_scheduler)
+
+            def tick():
+                client.portal.call(run_tick)
+
+            results.append(measure("scheduler_tick", tick, repeat, backend=backend, size=size, due=len(due)))
+            results.append(measure("GET /tasks", lambda: client.get("/tasks"), repeat, backend=backend, size=size))
+            results.append(measure(
+                "GET /tasks?limit=50",
+                lambda: client.get("/tasks", params={"limit": 50, "assigned_to": devices[0].id}),
+                repeat, backend=backend, size=size,
+            ))
+            results.append(measure(
+                "POST /ha/action",
+                lambda: client.post("/ha/action", json={"action": f"TASK_DONE_{tasks[rng.randrange(len(tasks))].id}"}),
+                repeat, backend=backend, size=size,
+            ))
+    return results
+
+
+@contextmanager
+def slow_disk(latency: float) -> Iterator[None]:
+    """
+    Add `latency` seconds to every storage commit, like an SD card would.
+
+    Patches the commit hooks of all backends rather than os.fsync, since
+    SQLite syncs from C code.
+    """
+    if latency <= 0:
+        yield
+        return
+    originals = {cls: cls.__dict__["_commit"] for cls in STORAGE_BACKENDS.values() if "_commit" in cls.__dict__}
+
+    def patched(original):
+        def commit(self, *args):
+            if not self._batch_depth:
+                time.sleep(latency)
+            return original(self, *args)
+        return commit
+
+    for cls, original in originals.items():
+        cls._commit = patched(original)
+    try:
+        yield
+    finally:
+        for cls, original in originals.items():
+            cls._commit = original
+
+
+def percentiles(name: str, timings: List[float], **labels) -> Dict:
+    """Summarize request latencies (seconds) with tail percentiles."""
+    timings.sort()
+
+    def pct(p: float) -> float:
+        return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+    result = {
+        "name": name,
+        **labels,
+        "requests": len(timings),
+        "median": statistics.median(timings),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": timings[-1],
+    }
+    print(
+        f"{name:<28} {' '.join(f'{k}={v}' for k, v in labels.items()):<32} "
+        f"median {result['median'] * 1000:9.3f} ms  p99 {result['p99'] * 1000:9.3f} ms"
+    )
+    return result
+
+
+def bench_concurrency(
+    backend: str,
+    size: int,
+    tasks: List[Task],
+    devices: List[Device],
+    concurrency: int,
+    rate: float,
+    requests: int,
+    disk_latency: float,
+) -> List[Dict]:
+    """
+    Latency percentiles under concurrent load.
+
+    Requests arrive at a fixed `rate` per second whether or not earlier ones
+    have finished (open loop), with up to `concurrency` in flight. The mix is
+    40% /health, 40% GET /tasks/{id} and 20% POST /tasks/{id}/done. Latency
+    is measured from the planned arrival time, so time spent waiting for a
+    free connection counts too.
+    """
+    import httpx
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+
+    timings: Dict[str, List[float]] = {"GET /health": [], "GET /tasks/{id}": [], "POST /tasks/{id}/done": []}
+
+    async def one_request(http: httpx.AsyncClient, slots: asyncio.Semaphore, kind: str, path: str, arrival: float):
+        async with slots:
+            if kind.startswith("POST"):
+                response = await http.post(path)
+            else:
+                response = await http.get(path)
+        timings[kind].append(time.perf_counter() - arrival)
+        response.raise_for_status()
+
+    async def run_load() -> None:
+        rng = random.Random(3)
+        slots = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            pending = []
+            started = time.perf_counter()
+            for i in range(requests):
+                arrival = started + i / rate
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+                task_id = tasks[rng.randrange(len(tasks))].id
+                roll = rng.random()
+                if roll < 0.4:
+                    kind, path = "GET /health", "/health"
+                elif roll < 0.8:
+                    kind, path = "GET /tasks/{id}", f"/tasks/{task_id}"
+                else:
+                    kind, path = "POST /tasks/{id}/done", f"/tasks/{task_id}/done"
+                pending.append(asyncio.create_task(one_request(http, slots, kind, path, arrival)))
+            await asyncio.gather(*pending)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        populate(backend, data_dir, tasks, devices)
+        os.environ["DATA_DIR"] = data_dir
+        os.environ["STORAGE_BACKEND"] = backend
+
+        with slow_disk(disk_latency), TestClient(main.app) as client:
+            client.portal.call(run_load)
+
+    labels = dict(backend=backend, size=size, rate=rate, disk_latency_ms=disk_latency * 1000)
+    return [percentiles(kind, samples, **labels) for kind, samples in timings.items()]
+
+
+def git_revision() -> Optional[str]:
+    """Current commit of the repository, if available."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma-separated task counts (default: 10,1000,10000)")
+    parser.add_argument("--backends", default=",".join(STORAGE_BACKENDS), help="Comma-separated storage backends")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per benchmark (default: 20)")
+    parser.add_argument("--max-due", type=int, default=200, help="Tasks due in the scheduler tick (default: 200)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Run only the concurrent load benchmark, at this many requests per second")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Requests in flight at most during the load run (default: 50)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per load run (default: 2000)")
+    parser.add_argument("--disk-latency", type=float, default=0.0,
+                        help="Milliseconds added to every storage commit in the load run (default: 0)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON output file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    backends = args.backends.split(",")
+
+    # Keep the app quiet and pointed at the mock
+    import logging
+    logging.disable(logging.WARNING)
+    mock_ha, ha_url = start_mock_ha()
+    os.environ.update(HA_URL=ha_url, HA_TOKEN="benchmark", HA_EVENT_LISTENER="false")
+
+    results = []
+    for size in sizes:
+        tasks, devices = generate_household(size)
+        if args.rate:
+            for backend in backends:
+                results.extend(bench_concurrency(
+                    backend, size, tasks, devices, args.concurrency, args.rate, args.requests, args.disk_latency / 1000
+                ))
+            continue
+        results.extend(bench_compute_next_due(size, tasks, args.repeat))
+        for backend in backends:
+            results.extend(bench_storage(backend, size, tasks, devices, args.repeat))
+            results.extend(bench_app(backend, size, tasks, devices, args.repeat, min(args.max_due, size)))
+    mock_ha.terminate()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Make the add-on's `app` package importable however pytest is invoked
+(plain `pytest`, `python -m pytest`, from the add-on or the repository root).
+"""
+import os
+import sys
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ADDON_DIR not in sys.path:
+    sys.path.insert(0, ADDON_DIR)
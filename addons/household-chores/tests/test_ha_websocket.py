@@ -0,0 +1,183 @@
+"""
+Tests for HAEventListener against a local fake of the Home Assistant
+WebSocket API.
+
+Run with: pytest tests
+"""
+import asyncio
+import json
+
+import websockets
+
+from app import ha_websocket, main
+from app.ha_websocket import HAAuthError, HAEventListener
+
+TOKEN = "test-token"
+
+
+class FakeHomeAssistant:
+    """Minimal WebSocket API server: auth, subscribe_events and events."""
+
+    def __init__(self, events=(), drop_first=False):
+        """
+        Args:
+            events: Events sent to each subscriber after it subscribed
+            drop_first: Close the first connection right after subscribing
+        """
+        self.events = list(events)
+        self.drop_first = drop_first
+        self.connections = 0
+        self.subscriptions = []
+        self.subscribed = asyncio.Event()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}/api/websocket"
+
+    async def __aenter__(self):
+        self._server = await websockets.serve(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, ws, path=None):
+        self.connections += 1
+        await ws.send(json.dumps({"type": "auth_required", "ha_version": "2024.1.0"}))
+        auth = json.loads(await ws.recv())
+        if auth != {"type": "auth", "access_token": TOKEN}:
+            await ws.send(json.dumps({"type": "auth_invalid", "message": "Invalid access token"}))
+            return
+        await ws.send(json.dumps({"type": "auth_ok", "ha_version": "2024.1.0"}))
+
+        subscribe = json.loads(await ws.recv())
+        self.subscriptions.append(subscribe)
+        await ws.send(json.dumps({"id": subscribe["id"], "type": "result", "success": True, "result": None}))
+        self.subscribed.set()
+
+        if self.drop_first and self.connections == 1:
+            return
+        for event in self.events:
+            await ws.send(json.dumps({"id": subscribe["id"], "type": "event", "event": event}))
+        await ws.wait_closed()
+
+
+def action_event(action: str, tag: str = None, context_id: str = "ctx-1") -> dict:
+    """A mobile_app_notification_action event as Home Assistant sends it."""
+    data = {"action": action}
+    if tag:
+        data["tag"] = tag
+    return {
+        "event_type": "mobile_app_notification_action",
+        "data": data,
+        "origin": "REMOTE",
+        "time_fired": "2024-12-01T16:00:05+00:00",
+        "context": {"id": context_id},
+    }
+
+
+async def _run_until(listener: HAEventListener, condition, timeout: float = 5.0) -> None:
+    """Run the listener in the background until condition() holds."""
+    task = asyncio.create_task(listener.run())
+    try:
+        async with asyncio.timeout(timeout):
+            while not condition():
+                await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def test_websocket_url():
+    assert ha_websocket.websocket_url("http://homeassistant.local:8123") == "ws://homeassistant.local:8123/api/websocket"
+    assert ha_websocket.websocket_url("https://ha.example.com/") == "wss://ha.example.com/api/websocket"
+    assert ha_websocket.websocket_url("http://supervisor/core") == "ws://supervisor/core/websocket"
+
+
+def test_handshake_and_subscription():
+    async def scenario():
+        received = []
+
+        async def handler(event):
+            received.append(event)
+
+        event = action_event("TASK_DONE_abc123")
+        async with FakeHomeAssistant(events=[event]) as server:
+            listener = HAEventListener(server.url, TOKEN, handler)
+            await _run_until(listener, lambda: received)
+
+        assert server.subscriptions == [
+            {"id": 1, "type": "subscribe_events", "event_type": "mobile_app_notification_action"}
+        ]
+        assert received == [event]
+
+    asyncio.run(scenario())
+
+
+def test_invalid_token_raises():
+    async def scenario():
+        async def handler(event):
+            pass
+
+        async with FakeHomeAssistant() as server:
+            listener = HAEventListener(server.url, "wrong-token", handler)
+            try:
+                await listener.listen_once()
+            except HAAuthError:
+                pass
+            else:
+                raise AssertionError("HAAuthError not raised")
+            assert not listener.connected
+            assert server.subscriptions == []
+
+    asyncio.run(scenario())
+
+
+def test_notification_action_reaches_apply_action(monkeypatch):
+    async def scenario():
+        applied = []
+
+        async def fake_apply_action(action, key=None):
+            applied.append((action, key))
+            return {"status": "ok", "action": "task_done"}
+
+        monkeypatch.setattr(main, "apply_action", fake_apply_action)
+        events = [
+            action_event("SOME_OTHER_ACTION"),  # Not ours: ignored
+            action_event("TASK_DONE_abc123", tag="chores-abc123-7"),
+        ]
+        async with FakeHomeAssistant(events=events) as server:
+            listener = HAEventListener(server.url, TOKEN, main.handle_notification_action_event)
+            await _run_until(listener, lambda: applied)
+
+        assert applied == [("TASK_DONE_abc123", main.action_key("TASK_DONE_abc123", "chores-abc123-7", "ctx-1"))]
+
+    asyncio.run(scenario())
+
+
+def test_reconnects_after_server_drops(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(ha_websocket, "RECONNECT_MIN_DELAY", 0.01)
+        received = []
+
+        async def handler(event):
+            received.append(event)
+
+        event = action_event("TASK_POSTPONE_abc123")
+        async with FakeHomeAssistant(events=[event], drop_first=True) as server:
+            listener = HAEventListener(server.url, TOKEN, handler)
+            await _run_until(listener, lambda: received)
+
+        assert server.connections == 2
+        assert len(server.subscriptions) == 2
+        # Message ids start over on every connection
+        assert server.subscriptions[1]["id"] == 1
+        assert received == [event]
+
+    asyncio.run(scenario())
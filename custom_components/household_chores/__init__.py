@@ -6,6 +6,8 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 
+from .coordinator import HouseholdChoresCoordinator
+
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
 DOMAIN: Final = "household_chores"
@@ -14,10 +16,14 @@ PLATFORMS: list[Platform] = [Platform.BUTTON, Platform.SENSOR]
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Household Chores from a config entry."""
+    coordinator = HouseholdChoresCoordinator(hass, entry)
+    await coordinator.async_config_entry_first_refresh()
+
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = entry.data
+    hass.data[DOMAIN][entry.entry_id] = coordinator
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    coordinator.async_start_push()
     entry.async_on_unload(entry.add_update_listener(async_update_listener))
     return True
 
@@ -2,8 +2,12 @@
 import logging
 from homeassistant.components.button import ButtonEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .coordinator import HouseholdChoresCoordinator
+from .sensor import task_device_info
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,14 +20,31 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up the button platform."""
+    coordinator: HouseholdChoresCoordinator = hass.data[DOMAIN][entry.entry_id]
     async_add_entities(
         [
-            ReloadTasksButton(hass, entry),
+            ReloadTasksButton(coordinator),
             SyncDevicesButton(hass, entry),
-        ],
-        update_before_add=True,
+        ]
     )
 
+    known: set[str] = set()
+
+    @callback
+    def _async_add_new_tasks() -> None:
+        """Add Done and Postpone buttons for every task not seen before."""
+        new = [task_id for task_id in coordinator.data if task_id not in known]
+        known.update(new)
+        entities: list[ButtonEntity] = []
+        for task_id in new:
+            entities.append(TaskDoneButton(coordinator, task_id))
+            entities.append(TaskPostponeButton(coordinator, task_id))
+        if entities:
+            async_add_entities(entities)
+
+    _async_add_new_tasks()
+    entry.async_on_unload(coordinator.async_add_listener(_async_add_new_tasks))
+
 
 class ReloadTasksButton(ButtonEntity):
     """Button to reload tasks."""
@@ -31,14 +52,14 @@ class ReloadTasksButton(ButtonEntity):
     _attr_name = "Reload Household Chores Tasks"
     _attr_unique_id = "household_chores_reload_tasks"
 
-    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+    def __init__(self, coordinator: HouseholdChoresCoordinator) -> None:
         """Initialize the button."""
-        self.hass = hass
-        self._entry = entry
+        self.coordinator = coordinator
 
     async def async_press(self) -> None:
         """Handle button press."""
         _LOGGER.debug("Reload tasks button pressed")
+        await self.coordinator.async_request_refresh()
 
 
 class SyncDevicesButton(ButtonEntity):
@@ -55,3 +76,46 @@ class SyncDevicesButton(ButtonEntity):
     async def async_press(self) -> None:
         """Handle button press."""
         _LOGGER.debug("Sync devices button pressed")
+
+
+class TaskButton(CoordinatorEntity[HouseholdChoresCoordinator], ButtonEntity):
+    """Base class for per-task buttons."""
+
+    _attr_has_entity_name = True
+    action = ""
+
+    def __init__(self, coordinator: HouseholdChoresCoordinator, task_id: str) -> None:
+        """Initialize the button."""
+        super().__init__(coordinator)
+        self.task_id = task_id
+        self._attr_unique_id = f"{DOMAIN}_{task_id}_{self.action}"
+        self._attr_device_info = task_device_info(coordinator, task_id)
+
+    @property
+    def available(self) -> bool:
+        """Unavailable once the task has been deleted."""
+        return super().available and self.task_id in self.coordinator.data
+
+
+class TaskDoneButton(TaskButton):
+    """Mark a task as done."""
+
+    _attr_name = "Done"
+    _attr_icon = "mdi:check"
+    action = "done"
+
+    async def async_press(self) -> None:
+        """Handle button press."""
+        await self.coordinator.async_mark_done(self.task_id)
+
+
+class TaskPostponeButton(TaskButton):
+    """Postpone a task to tomorrow."""
+
+    _attr_name = "Postpone"
+    _attr_icon = "mdi:calendar-arrow-right"
+    action = "postpone"
+
+    async def async_press(self) -> None:
+        """Handle button press."""
+        await self.coordinator.async_postpone(self.task_id)
@@ -41,6 +41,8 @@ class HouseholdChoresConfigFlow(config_entries.ConfigFlow):
                 vol.Required("ha_token"): str,
                 vol.Optional("timezone", default="Europe/Stockholm"): str,
                 vol.Optional("port", default=8000): int,
+                vol.Optional("addon_url", default=""): str,
+                vol.Optional("use_push", default=True): bool,
                 vol.Optional("log_level", default="info"): vol.In(
                     ["debug", "info", "warning", "error"]
                 ),
@@ -0,0 +1,170 @@
+"""Data update coordinator for Household Chores Reminder."""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import Any
+
+import aiohttp
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "household_chores"
+
+# Polling interval with and without the /events push stream
+PUSH_SCAN_INTERVAL = timedelta(minutes=15)
+POLL_SCAN_INTERVAL = timedelta(seconds=60)
+
+# Reconnect backoff for the push stream, in seconds
+PUSH_RETRY_MIN = 5
+PUSH_RETRY_MAX = 300
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# The add-on sends a keep-alive comment every 15 seconds
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=60)
+
+TASK_EVENTS = ("task_created", "task_updated", "task_done", "task_postponed")
+
+
+class HouseholdChoresCoordinator(DataUpdateCoordinator[dict[str, dict[str, Any]]]):
+    """
+    Keep all tasks from the add-on in one place for every entity.
+
+    Tasks are fetched with a single call to /tasks/changes, which after the
+    first refresh only returns what changed. When push is enabled the
+    /events stream applies changes as they happen and polling becomes a
+    slow safety net.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Initialize the coordinator."""
+        self.use_push = entry.data.get("use_push", True)
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_interval=PUSH_SCAN_INTERVAL if self.use_push else POLL_SCAN_INTERVAL,
+        )
+        self._entry = entry
+        self._session = async_get_clientsession(hass)
+        self.base_url = (
+            entry.data.get("addon_url") or f"http://localhost:{entry.data.get('port', 8000)}"
+        ).rstrip("/")
+        self._revision = 0
+
+    async def _async_update_data(self) -> dict[str, dict[str, Any]]:
+        """Fetch the tasks changed since the last refresh."""
+        tasks = dict(self.data or {})
+        try:
+            async with self._session.get(
+                f"{self.base_url}/tasks/changes",
+                params={"since": self._revision},
+                headers={"If-None-Match": f'"{self._revision}"'},
+                timeout=REQUEST_TIMEOUT,
+            ) as resp:
+                if resp.status == 304:
+                    return tasks
+                resp.raise_for_status()
+                changes = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise UpdateFailed(f"Error fetching tasks from {self.base_url}: {err}") from err
+
+        if changes["reset"]:
+            tasks = {}
+        for task in changes["tasks"]:
+            tasks[task["id"]] = task
+        for task_id in changes["deleted"]:
+            tasks.pop(task_id, None)
+        self._revision = changes["revision"]
+        return tasks
+
+    async def _async_post(self, path: str, payload: dict[str, Any] | None = None) -> None:
+        """POST to the add-on API and refresh afterwards."""
+        try:
+            async with self._session.post(
+                f"{self.base_url}{path}", json=payload, timeout=REQUEST_TIMEOUT
+            ) as resp:
+                resp.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.error("Request to %s failed: %s", path, err)
+            return
+        if not self.use_push:
+            await self.async_request_refresh()
+
+    async def async_mark_done(self, task_id: str) -> None:
+        """Mark a task as done."""
+        await self._async_post(f"/tasks/{task_id}/done")
+
+    async def async_postpone(self, task_id: str) -> None:
+        """Postpone a task to the next day's notification time."""
+        await self._async_post("/ha/action", {"action": f"TASK_POSTPONE_{task_id}"})
+
+    @callback
+    def async_start_push(self) -> None:
+        """Start listening to the add-on's /events stream."""
+        if self.use_push:
+            self._entry.async_create_background_task(
+                self.hass, self._async_listen(), f"{DOMAIN} event stream"
+            )
+
+    async def _async_listen(self) -> None:
+        """Apply pushed events, reconnecting with backoff when the stream drops."""
+        delay = PUSH_RETRY_MIN
+        while True:
+            try:
+                async with self._session.get(
+                    f"{self.base_url}/events", timeout=STREAM_TIMEOUT
+                ) as resp:
+                    resp.raise_for_status()
+                    delay = PUSH_RETRY_MIN
+                    # Catch up on whatever happened while disconnected
+                    await self.async_request_refresh()
+                    await self._async_read_stream(resp)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                _LOGGER.debug("Event stream from %s lost: %s", self.base_url, err)
+            except Exception:
+                _LOGGER.exception("Unexpected error in event stream from %s", self.base_url)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, PUSH_RETRY_MAX)
+
+    async def _async_read_stream(self, resp: aiohttp.ClientResponse) -> None:
+        """Parse Server-Sent Events from a response until it ends."""
+        event_id, event_type, data = None, None, []
+        async for raw in resp.content:
+            try:
+                line = raw.decode().rstrip("\r\n")
+                if line.startswith("id:"):
+                    event_id = line[3:].strip()
+                elif line.startswith("event:"):
+                    event_type = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line:
+                    if event_type and data:
+                        self._apply_event(event_type, json.loads("\n".join(data)), event_id)
+                    event_id, event_type, data = None, None, []
+            except Exception:
+                # A malformed event must not stop the stream
+                _LOGGER.exception("Could not apply event %s from %s", event_type, self.base_url)
+                event_id, event_type, data = None, None, []
+
+    @callback
+    def _apply_event(self, event_type: str, payload: dict[str, Any], event_id: str | None = None) -> None:
+        """Update the task data from a single pushed event."""
+        tasks = dict(self.data or {})
+        if event_type in TASK_EVENTS:
+            task = payload["task"]
+            tasks[task["id"]] = task
+        elif event_type == "task_deleted":
+            tasks.pop(payload["task_id"], None)
+        else:
+            return
+        # The event id is the add-on's storage revision; the catch-up refresh
+        # after a reconnect only asks for what changed after it
+        if event_id:
+            self._revision = max(self._revision, int(event_id))
+        self.async_set_updated_data(tasks)
@@ -1,9 +1,17 @@
 """Sensor platform for Household Chores Reminder."""
 import logging
-from homeassistant.components.sensor import SensorEntity
+from datetime import datetime
+from typing import Any
+
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
+
+from .coordinator import HouseholdChoresCoordinator
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,33 +24,107 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up the sensor platform."""
-    async_add_entities(
-        [HouseholdChoresStatusSensor(hass, entry)],
-        update_before_add=True,
+    coordinator: HouseholdChoresCoordinator = hass.data[DOMAIN][entry.entry_id]
+    async_add_entities([HouseholdChoresStatusSensor(coordinator, entry)])
+
+    known: set[str] = set()
+
+    @callback
+    def _async_add_new_tasks() -> None:
+        """Add a sensor for every task not seen before."""
+        new = [task_id for task_id in coordinator.data if task_id not in known]
+        known.update(new)
+        if new:
+            async_add_entities(HouseholdChoresTaskSensor(coordinator, task_id) for task_id in new)
+
+    _async_add_new_tasks()
+    entry.async_on_unload(coordinator.async_add_listener(_async_add_new_tasks))
+
+
+def task_device_info(coordinator: HouseholdChoresCoordinator, task_id: str) -> DeviceInfo:
+    """Group a task's entities under one device."""
+    task = coordinator.data.get(task_id, {})
+    return DeviceInfo(
+        identifiers={(DOMAIN, task_id)},
+        name=task.get("name", task_id),
+        manufacturer="Household Chores Reminder",
+        model=task.get("frequency"),
     )
 
 
-class HouseholdChoresStatusSensor(SensorEntity):
+class HouseholdChoresStatusSensor(CoordinatorEntity[HouseholdChoresCoordinator], SensorEntity):
     """Status sensor for Household Chores Reminder."""
 
     _attr_name = "Household Chores Status"
     _attr_unique_id = "household_chores_status"
 
-    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+    def __init__(self, coordinator: HouseholdChoresCoordinator, entry: ConfigEntry) -> None:
         """Initialize the sensor."""
-        self.hass = hass
+        super().__init__(coordinator)
         self._entry = entry
 
+    @property
+    def available(self) -> bool:
+        """The status sensor reports errors instead of going unavailable."""
+        return True
+
     @property
     def state(self) -> str:
         """Return the state of the sensor."""
-        return "active"
+        return "active" if self.coordinator.last_update_success else "error"
 
     @property
     def extra_state_attributes(self) -> dict:
         """Return the state attributes."""
         return {
             "url": self._entry.data.get("ha_url"),
+            "addon_url": self.coordinator.base_url,
             "timezone": self._entry.data.get("timezone", "Europe/Stockholm"),
             "port": self._entry.data.get("port", 8000),
+            "tasks": len(self.coordinator.data or {}),
+        }
+
+
+class HouseholdChoresTaskSensor(CoordinatorEntity[HouseholdChoresCoordinator], SensorEntity):
+    """When a task is next due."""
+
+    _attr_has_entity_name = True
+    _attr_name = "Next due"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+
+    def __init__(self, coordinator: HouseholdChoresCoordinator, task_id: str) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.task_id = task_id
+        self._attr_unique_id = f"{DOMAIN}_{task_id}_next_due"
+        self._attr_device_info = task_device_info(coordinator, task_id)
+
+    @property
+    def task(self) -> dict[str, Any] | None:
+        """The task's latest data from the coordinator."""
+        return self.coordinator.data.get(self.task_id)
+
+    @property
+    def available(self) -> bool:
+        """Unavailable once the task has been deleted."""
+        return super().available and self.task is not None
+
+    @property
+    def native_value(self) -> datetime | None:
+        """Return the task's next due time."""
+        if self.task is None:
+            return None
+        return dt_util.parse_datetime(self.task["next_due"])
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the state attributes."""
+        if self.task is None:
+            return {}
+        return {
+            "task_id": self.task_id,
+            "name": self.task["name"],
+            "frequency": self.task["frequency"],
+            "last_done": self.task["last_done"],
+            "assigned_to": self.task["assigned_to"],
         }